@@ -0,0 +1,36 @@
+import gc
+import time
+import tracemalloc
+
+from kuku.core import base_actor, spawn
+from kuku.core.actor.base import behavior
+
+
+class IdleActor(base_actor):
+    @behavior(str)
+    def handle_message(self, message):
+        pass
+
+
+class LightIdleActor(IdleActor):
+    lightweight = True
+
+
+def bytes_per_idle_actor(actor_type, count=10000):
+    """Spawns `count` idle actors and returns the traced bytes per actor."""
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for _ in range(count):
+        spawn(actor_type)
+    time.sleep(1)  # let regular actors start their main tasks
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (after - before) / count
+
+
+if __name__ == '__main__':
+    for actor_type in (IdleActor, LightIdleActor):
+        print('{}: {:.0f} bytes per idle actor'.format(
+            actor_type.__name__, bytes_per_idle_actor(actor_type)))
@@ -1,8 +1,10 @@
 import functools
 import logging
+import time
 
 from kuku.actor import *
 from kuku.event_loop import *
+from kuku.host import *
 from kuku.router import *
 from kuku.slack_bot import *
 from kuku.slack_client import *
@@ -17,14 +19,15 @@ def configure(bot, **k):
     return bot
 
 
-def run_kuku(token, bots, bot_username='kuku'):
+def run_kuku(token, bots, bot_username='kuku', state_dir=None):
     print('Starting KUKU with token={}, bots={}'.format(
         token, ', '.join([cls.__name__ for cls in bots])))
 
     client_ref = SlackClientActor.start(
         token=token,
         router=configure(SlackMessageRouterActor, bots=bots),
-        bot_username=bot_username
+        bot_username=bot_username,
+        state_dir=state_dir
     )
 
     try:
@@ -32,3 +35,21 @@ def run_kuku(token, bots, bot_username='kuku'):
             continue
     finally:
         print('Terminating KUKU...')
+
+
+def run_kuku_host(tokens, bots, bot_username='kuku', worker_count=None, state_dir=None):
+    print('Starting KUKU host with {} workspaces, bots={}'.format(
+        len(tokens), ', '.join([cls.__name__ for cls in bots])))
+
+    host = WorkspaceHost(bots, bot_username=bot_username, worker_count=worker_count,
+                         state_dir=state_dir)
+    host.start()
+    host.set_workspaces(tokens)
+
+    try:
+        while True:
+            time.sleep(60)
+            print('KUKU host health: {}'.format(host.health()['workers']))
+    finally:
+        print('Terminating KUKU host...')
+        host.stop()
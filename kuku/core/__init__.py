@@ -1,5 +1,7 @@
 from .actor import *
+from .stream import *
 
 __all__ = (
-    actor.__all__
+    actor.__all__ +
+    stream.__all__
 )
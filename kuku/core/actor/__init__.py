@@ -4,6 +4,12 @@ from .mailbox import *
 from .actor import *
 from .ref import *
 from .cluster import *
+from .remote import *
+from .supervision import *
+from .gateway import *
+from .watchdog import *
+from .persistence import *
+from .cache import *
 
 __all__ = (
     base.__all__ +
@@ -11,5 +17,11 @@ __all__ = (
     mailbox.__all__ +
     actor.__all__ +
     ref.__all__ +
-    cluster.__all__
+    cluster.__all__ +
+    remote.__all__ +
+    supervision.__all__ +
+    gateway.__all__ +
+    watchdog.__all__ +
+    persistence.__all__ +
+    cache.__all__
 )
@@ -1,10 +1,17 @@
+from asyncio import get_event_loop
+from collections import deque
 import inspect
+from itertools import count
 from uuid import uuid4
 
-from .base import ActorLifeCycle, behavior, MSG_TYPE_KEY, UnknownMessageTypeError
+from .base import ActorLifeCycle, behavior, logger, MSG_TYPE_KEY, UnknownMessageTypeError
+from .cluster import get_actor_by_uuid, loop_stats, unregister_actor
 from .context import ActorContext
-from .mailbox import Mailbox
-from .message import SystemMessage
+from .mailbox import LightMailbox, Mailbox
+from .message import CacheInvalidate, ErrorForward, SystemMessage
+from .persistence import Persistence, track_state
+from .ref import ActorRef
+from .supervision import OneForOne
 
 __all__ = (
     'ActorMeta',
@@ -13,6 +20,10 @@ __all__ = (
 )
 
 
+# Lightweight actors are identified by a process-wide counter instead of uuid4.
+_actor_ids = count(1)
+
+
 class ActorMeta(type):
     @classmethod
     def __prepare__(mcs, name, bases):
@@ -24,33 +35,109 @@ class ActorMeta(type):
         class_behaviors = [
             attr for attr in attrs.values()
             if hasattr(attr, MSG_TYPE_KEY)]
+        # Bases built by this metaclass carry their inherited behaviors too.
         base_behaviors = [
-            attr for base in bases
-            for attr in base.__dict__.values()
-            if hasattr(attr, MSG_TYPE_KEY)]
+            behav for base in bases
+            for behav in getattr(base, 'behaviors', {}).values()]
 
         for behav in class_behaviors + base_behaviors:
             msg_type = getattr(behav, MSG_TYPE_KEY)
             if msg_type not in actor.behaviors:
                 actor.behaviors[msg_type] = behav
 
+        # Shared by every ActorRef of this type for RPC-style calls.
+        actor.msg_types = {behav.__name__: msg_type
+                           for (msg_type, behav) in actor.behaviors.items()}
+
+        # Assignments to persistent attributes mark them for the next checkpoint.
+        if actor.persistent_state and '__setattr__' not in attrs:
+            actor.__setattr__ = track_state
+
         return actor
 
 
 class AsyncActor(metaclass=ActorMeta):
+    """Base class of all actors.
+
+    Setting ``lightweight = True`` on a subclass trades a little latency on
+    the first message for a much smaller idle footprint: the actor gets a
+    counter-based id, its ActorContext is created on the first message, and
+    it holds no task while its mailbox is empty. An idle lightweight actor,
+    including its ref and registry entry, costs about 0.5 KB (vs. roughly
+    5 KB for a regular actor); see ``benchmarks/footprint.py`` to re-measure.
+
+    Only lightweight actors can be migrated between loops by the cluster's
+    balancer, since a regular actor is bound to the loop of its main task.
+
+    Setting ``isolated = True`` (or passing ``isolated=True`` to `spawn`)
+    hosts the actor in a worker process instead, for CPU-bound behaviors.
+
+    Setting ``announced = True`` makes a node (see `start_node`) announce the
+    actors of this type to its peers, whose `get_actors` and
+    `get_actor_by_uuid` then return refs to them. Other actors are reached
+    from other nodes only through refs sent to them, e.g. as a sender.
+
+    A behavior that raises suspends the actor: later messages are stashed
+    and its supervisor (the parent, or the actor itself if it has none)
+    decides through its `supervisor_strategy` whether to restart it in place;
+    an actor whose parent has died is stopped instead.
+    A restart cancels the actor's timers, calls `before_restart`, drops all
+    instance attributes set by the actor's own code, calls `before_start`
+    again with the original arguments and then replays the stash. Refs and
+    the mailbox survive.
+    """
+
     default_timeout = 60
+    lightweight = False
+    isolated = False
+    announced = False
+    supervisor_strategy = OneForOne()
     behaviors = {}
 
+    # Failure state; class-level defaults keep them out of idle instances.
+    suspended = False
+    restart_count = 0
+    _stash = None
+
+    # Names of attributes checkpointed once `enable_persistence` was called;
+    # `persistence_key` must then tell instances apart across runs.
+    persistent_state = ()
+    _persistence = None
+
+    # Set through `enable_profiling`.
+    _profiler = None
+
+    # Results of `cacheable` behaviors by behavior name.
+    _caches = None
+
+    # Instance attributes kept across a restart.
+    _runtime_attrs = frozenset([
+        'parent', 'life_cycle', 'uuid', 'mailbox', '_context', 'execution',
+        '_init_args', '_init_kwargs', 'suspended', 'restart_count', '_stash',
+        '_persistence'])
+
     def __init__(self, loop, parent, init_args, init_kwargs):
         self.parent = parent
-        self.uuid = uuid4()
         self.life_cycle = ActorLifeCycle.born
-        self.mailbox = Mailbox(loop)
-        self.context = ActorContext(self, loop)
+        self._init_args = init_args
+        self._init_kwargs = init_kwargs
+        if self.lightweight:
+            self.uuid = next(_actor_ids)
+            self.mailbox = LightMailbox(loop, self._schedule, loop_stats(loop))
+            self._context = None
+        else:
+            self.uuid = uuid4()
+            self.mailbox = Mailbox(loop, loop_stats(loop))
+            self._context = ActorContext(self, loop)
 
         self.before_start(*init_args, **init_kwargs)
+        if self.persistent_state:
+            self._persistence = Persistence.attach(self)
 
-        self.execution = self.context.run_main(self._main())
+        if self.lightweight:
+            self.execution = None
+        else:
+            self.execution = self.context.run_main(self._main())
 
     def before_start(self, *args, **kwargs):
         pass
@@ -58,6 +145,28 @@ class AsyncActor(metaclass=ActorMeta):
     def before_die(self):
         pass
 
+    def persistence_key(self):
+        return None
+
+    def after_restore(self):
+        pass
+
+    def mark_dirty(self, *names):
+        """Marks `persistent_state` attributes (all by default) as changed.
+        Assigning one marks it already; call this after changing one in place,
+        e.g. adding to a dict, for the change to be checkpointed."""
+        if self._persistence is not None:
+            self._persistence.dirty.update(names or self.persistent_state)
+
+    def before_restart(self):
+        self.before_die()
+
+    @property
+    def context(self):
+        if self._context is None:
+            self._context = ActorContext(self, self.mailbox.loop)
+        return self._context
+
     @property
     def sender(self):
         return self.context.sender
@@ -68,38 +177,184 @@ class AsyncActor(metaclass=ActorMeta):
                 return self.behaviors[type_]
         raise UnknownMessageTypeError('Unknown message type: {}'.format(type(msg)))
 
+    def _process(self, envelope):
+        stats = self.mailbox.stats
+        if stats is not None:
+            stats.record(self)
+        if (self.suspended and envelope.resp_token is None and
+                not isinstance(envelope.message, SystemMessage)):
+            if self._stash is None:
+                self._stash = deque()
+            self._stash.append(envelope)
+            return
+        persistence = self._persistence
+        if persistence is not None and not persistence.restored:
+            persistence.restore(self)
+        try:
+            if envelope.resp_token is not None:
+                self.context.resolve_reply(envelope)
+            else:
+                behav = self._find_behavior(envelope.message)
+                with self.context.msg_scope(envelope):
+                    if inspect.iscoroutinefunction(behav):
+                        self.context.run_coroutine_behavior(
+                            behav(self, envelope.message))
+                    elif getattr(behav, 'returns_coroutine', False):
+                        # May answer right away instead, e.g. a `cacheable` hit.
+                        result = behav(self, envelope.message)
+                        if inspect.iscoroutine(result):
+                            self.context.run_coroutine_behavior(result)
+                    elif self._profiler is not None:
+                        self._profiler.call(
+                            type(envelope.message), behav, self, envelope.message)
+                    else:
+                        behav(self, envelope.message)
+                if persistence is not None:
+                    persistence.checkpoint(self)
+        except Exception as e:
+            if envelope.req_token is not None and isinstance(envelope.sender, ActorRef):
+                with self.context.msg_scope(envelope):
+                    envelope.sender.reply(ErrorForward(e))
+            self._fail(e)
+
+    def _fail(self, error):
+        # Suspends this actor and reports `error` to its supervisor.
+        if self.suspended or self.life_cycle == ActorLifeCycle.dead:
+            return
+        logger.error('{} failed'.format(type(self).__name__), exc_info=error)
+        self.suspended = True
+        if isinstance(self.parent, ActorRef):
+            if get_actor_by_uuid(self.parent.actor_uuid) is None:
+                # The parent has died, so nothing would ever restart this actor.
+                self.context.ref.tell(SystemMessage.kill(), sender=self.context.ref)
+                return
+            supervisor = self.parent
+        else:
+            supervisor = self.context.ref
+        supervisor.tell(SystemMessage.failed(error), sender=self.context.ref)
+
+    def _restart(self):
+        if self._context is not None:
+            self._context.cancel_timers()
+        try:
+            self.before_restart()
+        except Exception as e:
+            logger.error('{}.before_restart failed'.format(type(self).__name__), exc_info=e)
+
+        for attr in list(vars(self)):
+            if attr not in self._runtime_attrs:
+                delattr(self, attr)
+        self.restart_count += 1
+        self.suspended = False
+        if self._persistence is not None:
+            # The checkpointed state went with the attributes; restore it again.
+            self._persistence.restored = False
+
+        try:
+            self.before_start(*self._init_args, **self._init_kwargs)
+        except Exception as e:
+            self._fail(e)
+            return
+
+        while self._stash and not self.suspended:
+            self._process(self._stash.popleft())
+
     async def _main(self):
         while True:
-            try:
-                envelope = await self.mailbox.get()
-                if envelope.resp_token:
-                    self.context.resolve_reply(envelope)
-                else:
-                    behav = self._find_behavior(envelope.message)
-                    with self.context.msg_scope(envelope):
-                        if inspect.iscoroutinefunction(behav):
-                            self.context.run_coroutine_behavior(
-                                behav(self, envelope.message))
-                        else:
-                            behav(self, envelope.message)
+            envelope = await self.mailbox.get()
+            self._process(envelope)
+            if self.life_cycle == ActorLifeCycle.stopped:
+                break
+
+        self._die()
+
+    def _schedule(self):
+        # Called on the actor's loop when a lightweight mailbox becomes non-empty.
+        loop = self.mailbox.loop
+        if loop is not get_event_loop():
+            # Woken on a loop this actor has migrated away from.
+            loop.call_soon_threadsafe(self._schedule)
+        elif self.execution is None:
+            self.execution = self.context.run_main(self._drain())
+
+    def _can_migrate(self):
+        return (self.lightweight and
+                self.execution is None and
+                not self.mailbox and
+                self.life_cycle != ActorLifeCycle.dead and
+                (self._context is None or self._context.is_idle()))
+
+    def _migrate(self, loop):
+        # Moves this actor to `loop`. Must be called on the actor's current
+        # loop and only while `_can_migrate()` holds; refs stay valid and message
+        # order is kept since senders enqueue into the same mailbox. The
+        # context moves first: once the mailbox has moved, a sender may wake
+        # this actor on `loop` at once, and its task must be created there.
+        if self._context is not None:
+            self._context.move_to(loop)
+        self.mailbox.move_to(loop, loop_stats(loop))
 
+    async def _drain(self):
+        # Never awaits, so a whole drain runs within a single task step.
+        try:
+            while True:
+                while self.mailbox and self.life_cycle != ActorLifeCycle.stopped:
+                    self._process(self.mailbox.get_nowait())
                 if self.life_cycle == ActorLifeCycle.stopped:
                     break
-            except Exception as e:
-                print('Error occurred: {}'.format(e))
-                # TODO: supervised by parent
+                if not self.mailbox.release():
+                    break
+        finally:
+            self.execution = None
+
+        if self.life_cycle == ActorLifeCycle.stopped:
+            self._die()
 
+    def _die(self):
         self.before_die()
         self.life_cycle = ActorLifeCycle.dead
+        self._stash = None
+        if self._context is not None:
+            self._context.cancel_timers()
+        if self._persistence is not None and self._persistence.discard:
+            self._persistence.forget()
+
+        ref = self.context.ref
+        if isinstance(self.parent, ActorRef):
+            self.parent.tell(SystemMessage.terminated(), sender=ref)
+        if ref is not None:
+            unregister_actor(ref)
 
     @behavior(object)
     def _unhandled(self, message):
         print('UnRegistered message type: {}'.format(type(message)))
 
+    @behavior(CacheInvalidate)
+    def _invalidate_cache(self, message):
+        if self._caches is None:
+            return
+        if message.behavior is None:
+            caches = list(self._caches.values())
+        else:
+            caches = [self._caches[message.behavior]] if message.behavior in self._caches else []
+        for cache in caches:
+            if message.key is None:
+                cache.invalidate()
+            else:
+                cache.invalidate(message.key)
+
     @behavior(SystemMessage)
     def _handle_system_message(self, message):
         if message.command == 'kill':
             self.life_cycle = ActorLifeCycle.stopped
+            if message.kwargs.get('forget_state') and self._persistence is not None:
+                self._persistence.discard = True
+        elif message.command == 'restart':
+            self._restart()
+        elif message.command == 'failed':
+            self.context.handle_failure(self.sender, *message.args)
+        elif message.command == 'terminated':
+            self.context.remove_child(self.sender)
 
 
 base_actor = AsyncActor
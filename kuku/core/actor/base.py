@@ -1,4 +1,5 @@
 from enum import Enum
+import importlib
 import logging
 
 __all__ = (
@@ -37,3 +38,15 @@ def behavior(msg_type):
         setattr(f, MSG_TYPE_KEY, msg_type)
         return f
     return decorator
+
+
+def type_path(actor_type):
+    return '{}:{}'.format(actor_type.__module__, actor_type.__qualname__)
+
+
+def resolve_type(path):
+    module, _, qualname = path.partition(':')
+    obj = importlib.import_module(module)
+    for name in qualname.split('.'):
+        obj = getattr(obj, name)
+    return obj
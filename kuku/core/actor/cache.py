@@ -0,0 +1,190 @@
+from collections import OrderedDict
+from functools import wraps
+import inspect
+
+from .message import ErrorForward
+from .ref import ActorRef
+
+__all__ = (
+    'cacheable',
+)
+
+
+_MISSING = object()
+
+
+def _slot_names(cls):
+    # Slots of `cls` and of all its bases.
+    names = []
+    for klass in reversed(cls.__mro__):
+        slots = klass.__dict__.get('__slots__', ())
+        if isinstance(slots, str):
+            slots = (slots, )
+        names.extend(name for name in slots if name not in ('__dict__', '__weakref__'))
+    return names
+
+
+def default_key(message):
+    """Compares messages by type and field values, as RPC calls build a new
+    message object per call."""
+    slots = _slot_names(type(message))
+    if not slots and not hasattr(message, '__dict__'):
+        return message
+    fields = [(name, getattr(message, name, None)) for name in slots]
+    fields.extend(sorted(getattr(message, '__dict__', {}).items()))
+    return type(message), tuple(fields)
+
+
+def _cache_key(key_fn, message):
+    # Messages with unhashable fields are not cached.
+    cache_key = key_fn(message)
+    try:
+        hash(cache_key)
+    except TypeError:
+        return _MISSING
+    return cache_key
+
+
+class BehaviorCache(object):
+    """ LRU of behavior results with an optional TTL, plus the requests that
+    wait on an execution already in flight. """
+    __slots__ = ('maxsize', 'ttl', 'entries', 'inflight', 'hits', 'misses', 'merged')
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires at, result)
+        self.inflight = {}            # key -> envelopes waiting for the result
+        self.hits = 0
+        self.misses = 0
+        self.merged = 0
+
+    def get(self, key, now):
+        entry = self.entries.get(key)
+        if entry is None:
+            return _MISSING
+        if entry[0] is not None and entry[0] <= now:
+            del self.entries[key]
+            return _MISSING
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, result, now):
+        self.entries[key] = (None if self.ttl is None else now + self.ttl, result)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, key=_MISSING):
+        if key is _MISSING:
+            self.entries.clear()
+        else:
+            self.entries.pop(key, None)
+
+
+def get_cache(actor, name, maxsize, ttl):
+    if actor._caches is None:
+        actor._caches = {}
+    cache = actor._caches.get(name)
+    if cache is None:
+        cache = actor._caches[name] = BehaviorCache(maxsize, ttl)
+    return cache
+
+
+def _answer(ctx, envelope, message):
+    if envelope.req_token is not None and isinstance(envelope.sender, ActorRef):
+        with ctx.msg_scope(envelope):
+            envelope.sender.reply(message)
+
+
+def cacheable(key=None, ttl=None, maxsize=1024):
+    """Caches the results of an idempotent behavior, which returns its result
+    instead of replying; the result is replied to the asker.
+
+    Results are kept per actor, by `key(message)` (`default_key` if None), for
+    `ttl` seconds (forever if None), at most `maxsize` of them, least recently
+    used first out. Identical asks arriving while a coroutine behavior runs
+    wait for that run instead of starting their own. Errors are not cached.
+    Put it below `behavior`:
+
+        @behavior(GetProfile)
+        @cacheable(key=lambda message: message.user_id, ttl=60)
+        async def get_profile(self, message):
+            return await self.api.fetch_profile(message.user_id)
+
+    Tell `CacheInvalidate('get_profile')` to drop cached results. Messages
+    whose key is unhashable always run the behavior.
+    """
+    key_fn = key or default_key
+
+    def decorator(f):
+        name = f.__name__
+
+        if inspect.iscoroutinefunction(f):
+            async def run(self, message, envelope, cache, cache_key):
+                ctx = self.context
+                if cache is None:
+                    result = await f(self, message)
+                    _answer(ctx, envelope, result)
+                    return result
+                waiters = cache.inflight[cache_key]
+                try:
+                    result = await f(self, message)
+                except Exception as e:
+                    for waiter in waiters:
+                        _answer(ctx, waiter, ErrorForward(e))
+                    raise
+                finally:
+                    del cache.inflight[cache_key]
+                cache.put(cache_key, result, self.mailbox.loop.time())
+                _answer(ctx, envelope, result)
+                for waiter in waiters:
+                    _answer(ctx, waiter, result)
+                return result
+
+            @wraps(f)
+            def wrapper(self, message):
+                # Called at dispatch: hits, and asks merged into a run in
+                # flight, are answered without a task; misses return the
+                # coroutine to run.
+                envelope = self.context.envelope
+                cache_key = _cache_key(key_fn, message)
+                if cache_key is _MISSING:
+                    return run(self, message, envelope, None, cache_key)
+                cache = get_cache(self, name, maxsize, ttl)
+                result = cache.get(cache_key, self.mailbox.loop.time())
+                if result is not _MISSING:
+                    cache.hits += 1
+                    _answer(self.context, envelope, result)
+                    return result
+                waiters = cache.inflight.get(cache_key)
+                if waiters is not None:
+                    cache.merged += 1
+                    waiters.append(envelope)
+                    return None
+                cache.misses += 1
+                cache.inflight[cache_key] = []
+                return run(self, message, envelope, cache, cache_key)
+            wrapper.returns_coroutine = True
+        else:
+            @wraps(f)
+            def wrapper(self, message):
+                ctx = self.context
+                cache_key = _cache_key(key_fn, message)
+                if cache_key is _MISSING:
+                    result = f(self, message)
+                    _answer(ctx, ctx.envelope, result)
+                    return result
+                cache = get_cache(self, name, maxsize, ttl)
+                result = cache.get(cache_key, self.mailbox.loop.time())
+                if result is not _MISSING:
+                    cache.hits += 1
+                else:
+                    cache.misses += 1
+                    result = f(self, message)
+                    cache.put(cache_key, result, self.mailbox.loop.time())
+                _answer(ctx, ctx.envelope, result)
+                return result
+
+        return wrapper
+    return decorator
@@ -1,22 +1,42 @@
-from threading import get_ident, Thread
+import os
+from threading import get_ident, Lock, Thread
 import random
+import time
 from asyncio import new_event_loop, set_event_loop
+from weakref import WeakKeyDictionary
 
-from .ref import ActorRef
+from .event_stream import EventStream
+from .ref import ActorRef, get_context_or_none
+from .scheduler import TimerWheel
 
 __all__ = (
+    'configure_cluster',
+    'get_cluster',
     'get_actors',
     'get_actor_by_uuid',
     'get_singleton_actor',
     'spawn',
-    'spawn_singleton'
+    'spawn_singleton',
+    'publish',
+    'subscribe',
+    'unsubscribe'
 )
 
 
+_settings = {}  # see `configure_cluster`
+
+
 def configure():
-    return {
-        'thread_count': 1,
+    settings = {
+        'thread_count': 1,          # event loop threads
+        'balance_interval': 1.0,    # seconds between load checks
+        'balance_threshold': 1.5,   # hottest/coldest message rate that triggers migration
+        'balance_min_rate': 100,    # messages per interval below which a loop is never shed
+        'process_count': os.cpu_count() or 1,  # worker processes for isolated actors
+        'stall_threshold': 1.0,     # seconds a loop may block before it is reported; None disables
     }
+    settings.update(_settings)
+    return settings
 
 
 def event_loop_thread(register_loop):
@@ -26,6 +46,35 @@ def event_loop_thread(register_loop):
     loop.run_forever()
 
 
+def balancer_thread(cluster, interval):
+    while True:
+        time.sleep(interval)
+        cluster.rebalance()
+
+
+class LoopStats(object):
+    """Per-loop message counters; only touched on the loop's own thread,
+    except `processed`, which the balancer reads."""
+    __slots__ = ('loop', 'processed', 'last_processed', 'actors')
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.processed = 0
+        self.last_processed = 0
+        # actor -> messages processed since the last check; weak so that
+        # actors dying in between are not kept alive.
+        self.actors = WeakKeyDictionary()
+
+    def record(self, actor):
+        self.processed += 1
+        self.actors[actor] = self.actors.get(actor, 0) + 1
+
+    def take_rate(self):
+        rate = self.processed - self.last_processed
+        self.last_processed = self.processed
+        return rate
+
+
 class ActorRegistry(object):
     def __init__(self):
         self.actors = {}
@@ -49,7 +98,15 @@ class ActorRegistry(object):
             '{} is already registered as singleton actor'.format(actor_ref.actor_type)
 
         self.singleton_actors[actor_ref.actor_type] = actor_ref
-        self.actors_by_uuid[actor_ref.uuid] = actor_ref
+        self.actors_by_uuid[actor_ref.actor_uuid] = actor_ref
+
+    def unregister_actor(self, actor_ref):
+        self.actors.get(actor_ref.actor_type, set([])).discard(actor_ref)
+        self.actors_by_uuid.pop(actor_ref.actor_uuid, None)
+
+    def snapshot(self):
+        # list() over a dict does not release the GIL, so this is a consistent copy.
+        return [ref for refs in list(self.actors.values()) for ref in list(refs)]
 
     def get_actors(self, actor_type):
         return self.actors.get(actor_type, set([]))
@@ -64,25 +121,121 @@ class ActorRegistry(object):
 class ActorCluster(object):
     instance = None
 
-    def __init__(self, registry):
+    def __init__(self, registry, loops=None):
         assert self.instance is None, \
             'Only one ActorCluster can be used'
         self._config = configure()
         self._loops = {}
-        self._threads = [Thread(target=event_loop_thread, args=[self._register_loop])
-                         for _ in range(self._config['thread_count'])]
-        for t in self._threads:
-            t.start()
-        while len(self._loops) < 1:
-            pass
+        self._stats = {}
+        self.driven_loop = None  # whose clock times gateway asks; see `Gateway`
+        if loops is None:
+            self._threads = [Thread(target=event_loop_thread, args=[self._register_loop])
+                             for _ in range(self._config['thread_count'])]
+            for t in self._threads:
+                t.start()
+            while len(self._loops) < self._config['thread_count']:
+                pass
+            self.watchdogs = self._start_watchdogs(self._config['stall_threshold'])
+        else:
+            # Loops driven by the caller, e.g. the test runtime.
+            self._threads = []
+            self.watchdogs = []
+            self.driven_loop = loops[0]
+            for (i, loop) in enumerate(loops):
+                self._loops[i] = loop
+                if len(loops) > 1:
+                    self._stats[loop] = LoopStats(loop)
         self._registry = registry
+        self._pool = None
+        self._pool_lock = Lock()
+        self.node = None
+        self.event_stream = EventStream()
+        self._timer_wheels = {}
+        self.state_log = None  # see `enable_persistence`
+
+        if len(self._threads) > 1:
+            self._balancer = Thread(
+                target=balancer_thread,
+                args=[self, self._config['balance_interval']],
+                daemon=True)
+            self._balancer.start()
 
     def _register_loop(self, thread_id, loop):
+        if self._config['thread_count'] > 1:
+            self._stats[loop] = LoopStats(loop)
         self._loops[thread_id] = loop
 
+    def _start_watchdogs(self, threshold):
+        if not threshold:
+            return []
+        from .watchdog import LoopWatchdog
+        return [LoopWatchdog(loop, thread_id, threshold).start()
+                for (thread_id, loop) in self._loops.items()]
+
+    def stalls(self):
+        return sorted((stall for watchdog in self.watchdogs for stall in watchdog.stalls),
+                      key=lambda stall: stall.started)
+
     def get_loop(self):
         return random.choice(list(self._loops.values()))
 
+    def loop_stats(self, loop):
+        return self._stats.get(loop)
+
+    def timer_wheel(self, loop):
+        # Called from any thread; setdefault keeps a single wheel per loop.
+        wheel = self._timer_wheels.get(loop)
+        if wheel is None:
+            wheel = self._timer_wheels.setdefault(loop, TimerWheel(loop))
+        return wheel
+
+    def get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                from .process import ProcessPool
+                self._pool = ProcessPool(self._config['process_count'])
+            return self._pool
+
+    def rebalance(self):
+        """Sheds load from the busiest loop to the least busy one.
+
+        Called periodically from the balancer thread. Only the actors that were
+        active on the busiest loop since the last check are considered, and
+        only those that are idle between messages are moved.
+        """
+        rates = [(stats.take_rate(), stats) for stats in self._stats.values()]
+        (cold_rate, cold), (hot_rate, hot) = (
+            min(rates, key=lambda r: r[0]), max(rates, key=lambda r: r[0]))
+
+        shed = (hot is not cold and
+                hot_rate >= self._config['balance_min_rate'] and
+                hot_rate > cold_rate * self._config['balance_threshold'])
+        if shed:
+            hot.loop.call_soon_threadsafe(
+                self._shed, hot, cold.loop, hot_rate - cold_rate)
+        for _, stats in rates:
+            # `_shed` clears the counters of the loop it sheds.
+            if not (shed and stats is hot):
+                stats.loop.call_soon_threadsafe(stats.actors.clear)
+
+    @staticmethod
+    def _shed(stats, target, gap):
+        # Runs on the hot loop. Moving `rate` messages narrows the gap by
+        # 2 * rate, so stop at half of it and skip actors that would
+        # overshoot (they would only make `target` the hot loop).
+        candidates = sorted(stats.actors.items(), key=lambda i: i[1], reverse=True)
+        stats.actors.clear()
+        moved = 0
+        for actor, rate in candidates:
+            if moved * 2 >= gap:
+                break
+            if moved + rate >= gap or actor.mailbox.loop is not stats.loop:
+                continue
+            if not actor._can_migrate():
+                continue
+            actor._migrate(target)
+            moved += rate
+
     def get_actors(self, actor_type):
         return self._registry.get_actors(actor_type)
 
@@ -94,6 +247,17 @@ class ActorCluster(object):
 
     def register_actor(self, actor_ref):
         self._registry.register_actor(actor_ref)
+        if self.node is not None:
+            self.node.announce(actor_ref)
+
+    def unregister_actor(self, actor_ref):
+        self._registry.unregister_actor(actor_ref)
+        self.event_stream.unsubscribe(actor_ref)
+        if self.node is not None:
+            self.node.retract(actor_ref)
+
+    def all_actors(self):
+        return self._registry.snapshot()
 
     def register_singleton_actor(self, actor_ref):
         self._registry.register_singleton_actor(actor_ref)
@@ -104,33 +268,89 @@ def create_cluster():
     ActorCluster.instance = ActorCluster(registry)
 
 
-# Create singleton cluster!
-create_cluster()
+_cluster_lock = Lock()
+
+
+def get_cluster():
+    """Returns the singleton cluster, which starts its loop threads on first use."""
+    cluster = ActorCluster.instance
+    if cluster is None:
+        with _cluster_lock:
+            if ActorCluster.instance is None:
+                create_cluster()
+            cluster = ActorCluster.instance
+    return cluster
+
+
+def configure_cluster(**settings):
+    """Overrides settings of `configure()`, e.g. ``thread_count=4``. Must be
+    called before the cluster starts, i.e. before the first spawn."""
+    unknown = set(settings) - set(configure())
+    if unknown:
+        raise TypeError('Unknown cluster settings: {}'.format(', '.join(sorted(unknown))))
+    with _cluster_lock:
+        if ActorCluster.instance is not None:
+            raise RuntimeError('The cluster has already started')
+        _settings.update(settings)
+
+
+def loop_stats(loop):
+    return get_cluster().loop_stats(loop)
+
+
+def timer_wheel(loop):
+    return get_cluster().timer_wheel(loop)
+
+
+def unregister_actor(actor_ref):
+    get_cluster().unregister_actor(actor_ref)
 
 
 def get_actors(actor_type):
-    return ActorCluster.instance.get_actors(actor_type)
+    return get_cluster().get_actors(actor_type)
 
 
 def get_actor_by_uuid(uuid):
-    return ActorCluster.instance.get_actor_by_uuid(uuid)
+    return get_cluster().get_actor_by_uuid(uuid)
 
 
 def get_singleton_actor(actor_type):
-    return ActorCluster.instance.get_singleton_actor(actor_type)
+    return get_cluster().get_singleton_actor(actor_type)
+
 
+def spawn(actor_type, *args, parent=ActorRef.nobody, isolated=None, **kwargs):
+    if isolated is None:
+        isolated = actor_type.isolated
 
-def spawn(actor_type, *args, parent=ActorRef.nobody, **kwargs):
-    actor = actor_type(ActorCluster.instance.get_loop(), parent, args, kwargs)
-    ref = ActorRef(actor)
-    ActorCluster.instance.register_actor(ref)
+    if isolated:
+        # Hosted in a worker process, which has no notion of `parent`.
+        ref = get_cluster().get_pool().host(actor_type, args, kwargs)
+    else:
+        actor = actor_type(get_cluster().get_loop(), parent, args, kwargs)
+        ref = ActorRef(actor)
+    get_cluster().register_actor(ref)
     return ref
 
 
 def spawn_singleton(actor_type, *args, parent=ActorRef.nobody, **kwargs):
-    ref = ActorCluster.instance.get_singleton_actor(actor_type)
+    ref = get_cluster().get_singleton_actor(actor_type)
     if ref is None:
-        actor = actor_type(ActorCluster.instance.get_loop(), parent, args, kwargs)
+        actor = actor_type(get_cluster().get_loop(), parent, args, kwargs)
         ref = ActorRef(actor)
-        ActorCluster.instance.register_singleton_actor(ref)
+        get_cluster().register_singleton_actor(ref)
     return ref
+
+
+def publish(message, topic=None, *, sender=None):
+    if sender is None:
+        ctx = get_context_or_none()
+        sender = ctx.ref if ctx is not None else ActorRef.nobody
+    get_cluster().event_stream.publish(message, topic, sender)
+
+
+def subscribe(actor_ref, topic):
+    get_cluster().event_stream.subscribe(actor_ref, topic)
+
+
+def unsubscribe(actor_ref, topic=None):
+    get_cluster().event_stream.unsubscribe(actor_ref, topic)
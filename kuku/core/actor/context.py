@@ -1,54 +1,167 @@
 from asyncio import Task, iscoroutine, TimeoutError
-from collections import namedtuple
 from functools import partial
-
-from pip.utils import cached_property
+import time
 
 from kuku.util import random_alphanumeric
-from .message import ErrorForward
-from .cluster import get_actor_by_uuid, spawn
+from .mailbox import deliver_each
+from .message import Envelope, ErrorForward, SystemMessage
+from .cluster import get_actor_by_uuid, spawn, subscribe, timer_wheel, unsubscribe
+from .ref import ActorRef, current_actor_task
+from .supervision import RestartStats
 
 __all__ = (
-    'ActorContext'
+    'ActorContext',
+    'GatherResult'
 )
 
 
 class ContextAwareTask(Task):
+    """ Task running the code of one actor.
+
+    `envelope` is the message being handled by the task. It is bound when the
+    task is created and rebound by `MessageScope` and by replies to the asks
+    of the task, so it never depends on how the task is stepped.
+    """
+
     def __init__(self, coro, actor_ctx):
         super().__init__(coro, loop=actor_ctx.loop)
         self.actor_ctx = actor_ctx
         self.envelope = actor_ctx.envelope
 
-    def _step(self, *args, **kwargs):
-        with self.actor_ctx.msg_scope(self.envelope):
-            super()._step(*args, **kwargs)
-
 
 class MessageScope(object):
-    __slots__ = ('actor_ctx', 'envelope')
+    __slots__ = ('actor_ctx', 'envelope', 'previous')
 
     def __init__(self, actor_ctx, envelope):
         self.actor_ctx = actor_ctx
         self.envelope = envelope
+        self.previous = None
 
     def __enter__(self):
+        self.previous = self.actor_ctx.envelope
         self.actor_ctx.envelope = self.envelope
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.actor_ctx.envelope = None
-
-
-ReplyInboxItem = namedtuple('ReplyInboxItem', ['reply_fut', 'timer_handle', 'task'])
+        self.actor_ctx.envelope = self.previous
+
+
+def _settle(fut, result=None, exception=None):
+    if fut.done():
+        return
+    if exception is not None:
+        fut.set_exception(exception)
+    else:
+        fut.set_result(result)
+
+
+class ReplyInboxItem(object):
+    __slots__ = ('reply_fut', 'timer_handle', 'task')
+
+    tokens = ()  # other tokens of the same entry
+
+    def __init__(self, reply_fut, timer_handle, task):
+        self.reply_fut = reply_fut
+        self.timer_handle = timer_handle
+        self.task = task
+
+    def settle(self, loop, result=None, exception=None):
+        """Completes the reply future from `loop`, which differs from the
+        future's own loop once the owning actor has migrated."""
+        fut_loop = self.reply_fut.get_loop()
+        if fut_loop is loop:
+            _settle(self.reply_fut, result, exception)
+        else:
+            fut_loop.call_soon_threadsafe(_settle, self.reply_fut, result, exception)
+
+    def resolve(self, loop, envelope):
+        """Handles a reply; returns True once the item is complete."""
+        if isinstance(envelope.message, ErrorForward):
+            self.settle(loop, exception=envelope.message.error)
+        else:
+            self.settle(loop, result=envelope.message)
+        if self.task is not None:
+            self.task.envelope = envelope
+        return True
+
+    def expire(self, loop):
+        self.settle(loop, exception=TimeoutError())
+
+
+class GatherResult(object):
+    """ Outcome of `ActorContext.scatter_gather`
+
+    `replies` and `errors` map target refs to their reply or to the error they
+    forwarded; targets that did not answer by the deadline map to a
+    TimeoutError in `errors`. Targets in neither map were no longer waited
+    for once the outcome was settled. `complete` tells whether the requested
+    quorum was reached.
+    """
+    __slots__ = ('replies', 'errors', 'complete')
+
+    def __init__(self):
+        self.replies = {}
+        self.errors = {}
+        self.complete = False
+
+
+class GatherInboxItem(ReplyInboxItem):
+    """One reply inbox entry and timer shared by all targets, each asked
+    with a token of its own, so that replies are matched whoever sends them
+    (e.g. an actor the target delegated to)."""
+    __slots__ = ('targets', 'quorum', 'result', 'tokens')
+
+    def __init__(self, reply_fut, timer_handle, task, targets, quorum, tokens):
+        super().__init__(reply_fut, timer_handle, task)
+        self.targets = targets  # request token -> ref, still pending
+        self.quorum = quorum    # successful replies needed, None for all answers
+        self.result = GatherResult()
+        self.tokens = tokens
+
+    def resolve(self, loop, envelope):
+        ref = self.targets.pop(envelope.resp_token, None)
+        if ref is None:
+            return False
+        if isinstance(envelope.message, ErrorForward):
+            self.result.errors[ref] = envelope.message.error
+        else:
+            self.result.replies[ref] = envelope.message
+
+        if self.quorum is None:
+            if self.targets:
+                return False
+        else:
+            replied = len(self.result.replies)
+            if replied < self.quorum and replied + len(self.targets) >= self.quorum:
+                return False
+        self._finish(loop)
+        return True
+
+    def expire(self, loop):
+        for ref in self.targets.values():
+            self.result.errors[ref] = TimeoutError()
+        self._finish(loop)
+
+    def _finish(self, loop):
+        self.targets = {}
+        if self.quorum is None:
+            self.result.complete = not self.result.errors
+        else:
+            self.result.complete = len(self.result.replies) >= self.quorum
+        self.settle(loop, result=self.result)
 
 
 class ActorContext(object):
     def __init__(self, actor, loop):
         self._actor = actor
         self._loop = loop
+        self._ref = None
 
-        self.envelope = None
+        self._envelope = None  # outside of the tasks of this actor
         self.reply_inbox = {}
         self.children = set([])
+        self.running_behaviors = 0
+        self.restart_stats = {}  # child uuid -> RestartStats
+        self.timers = None
 
     @property
     def loop(self):
@@ -58,9 +171,15 @@ class ActorContext(object):
     def parent(self):
         return self._actor.parent
 
-    @cached_property
+    @property
     def ref(self):
-        return get_actor_by_uuid(self._actor.uuid)
+        if self._ref is None:
+            ref = get_actor_by_uuid(self._actor.uuid)
+            if ref is None:
+                # Not registered yet, i.e. called from before_start.
+                return ActorRef(self._actor)
+            self._ref = ref
+        return self._ref
 
     @property
     def actor_uuid(self):
@@ -70,6 +189,19 @@ class ActorContext(object):
     def default_timeout(self):
         return type(self._actor).default_timeout
 
+    @property
+    def envelope(self):
+        task = current_actor_task(self)
+        return self._envelope if task is None else task.envelope
+
+    @envelope.setter
+    def envelope(self, envelope):
+        task = current_actor_task(self)
+        if task is None:
+            self._envelope = envelope
+        else:
+            task.envelope = envelope
+
     @property
     def sender(self):
         return self.envelope.sender if self.envelope else None
@@ -82,39 +214,102 @@ class ActorContext(object):
     def resp_token(self):
         return self.envelope.resp_token if self.envelope else None
 
-    def issue_req_token(self, reply_fut, timeout):
+    def _new_token(self):
         token = random_alphanumeric(6)
         while token in self.reply_inbox:
             token = random_alphanumeric(6)
+        return token
+
+    def issue_req_token(self, reply_fut, timeout):
+        token = self._new_token()
 
         timer_handle = self._loop.call_later(
             timeout, partial(self.timeout_reply, token))
         self.reply_inbox[token] = ReplyInboxItem(
-            reply_fut, timer_handle, Task.current_task(self._loop))
+            reply_fut, timer_handle, current_actor_task(self))
         return token
 
+    def _pop_reply(self, token):
+        item = self.reply_inbox.pop(token)
+        for other in item.tokens:
+            self.reply_inbox.pop(other, None)
+        item.timer_handle.cancel()
+        return item
+
     def cancel_reply(self, token):
         if token in self.reply_inbox:
-            item = self.reply_inbox.pop(token)
-            item.reply_fut.cancel()
-            item.timer_handle.cancel()
+            self._pop_reply(token).reply_fut.cancel()
 
     def timeout_reply(self, token):
         if token in self.reply_inbox:
-            item = self.reply_inbox.pop(token)
-            item.reply_fut.set_exception(TimeoutError)
-            item.timer_handle.cancel()
+            self._pop_reply(token).expire(self._loop)
 
     def resolve_reply(self, envelope):
+        # Late replies find no entry and are dropped here.
         token = envelope.resp_token
-        if token in self.reply_inbox:
-            item = self.reply_inbox.pop(token)
-            if isinstance(envelope.message, ErrorForward):
-                item.reply_fut.set_exception(envelope.message.error)
-            else:
-                item.reply_fut.set_result(envelope.message)
+        item = self.reply_inbox.get(token)
+        if item is not None and item.resolve(self._loop, envelope):
+            self._pop_reply(token)
+
+    def scatter_gather(self, refs, message, *, quorum=None, timeout=None):
+        """Asks every actor in `refs` with one shared deadline.
+
+        Returns a future resolving to a GatherResult once every target has
+        answered (by default), once `quorum` successful replies have arrived
+        (1 for first-reply-wins) or can no longer arrive, or at the deadline
+        with whatever has arrived by then. It never raises TimeoutError.
+        """
+        refs = {ref.actor_uuid: ref for ref in refs}
+        if quorum is not None:
+            quorum = min(quorum, len(refs))
+        fut = self._loop.create_future()
+        if not refs:
+            result = GatherResult()
+            result.complete = True
+            fut.set_result(result)
+            return fut
+
+        # The entry is kept under `token` too, which reserves the target
+        # tokens derived from it.
+        token = self._new_token()
+        targets = {'{}.{}'.format(token, i): ref for (i, ref) in enumerate(refs.values())}
+        timer_handle = self._loop.call_later(
+            timeout or self.default_timeout, partial(self.timeout_reply, token))
+        item = GatherInboxItem(
+            fut, timer_handle, current_actor_task(self), targets, quorum,
+            [token] + list(targets))
+        for target_token in item.tokens:
+            self.reply_inbox[target_token] = item
+
+        by_loop = {}
+        for (target_token, ref) in targets.items():
+            by_loop.setdefault(ref._mailbox.loop, []).append(
+                (ref._mailbox, Envelope(message, self.ref, req_token=target_token)))
+        deliver_each(by_loop)
+        return fut
+
+    def is_idle(self):
+        return self.running_behaviors == 0 and self.envelope is None
+
+    def move_to(self, loop):
+        """Re-homes this context on `loop`; called on the current loop.
+
+        Pending reply timers are cancelled here and re-armed on `loop` with
+        their remaining time. Reply futures stay on the loop they were created
+        on and are completed thread-safely (see `ReplyInboxItem.settle`).
+        """
+        old_loop, self._loop = self._loop, loop
+        for token, item in self.reply_inbox.items():
+            if item.tokens and item.tokens[0] != token:
+                continue  # a gather has one timer, under its first token
+            remaining = max(item.timer_handle.when() - old_loop.time(), 0)
             item.timer_handle.cancel()
-            item.task.envelope = envelope
+            loop.call_soon_threadsafe(self._rearm_reply, token, remaining)
+
+    def _rearm_reply(self, token, delay):
+        if token in self.reply_inbox:
+            self.reply_inbox[token].timer_handle = self._loop.call_later(
+                delay, partial(self.timeout_reply, token))
 
     def msg_scope(self, envelope):
         return MessageScope(self, envelope)
@@ -128,20 +323,96 @@ class ActorContext(object):
                 'argument of run_behavior() should be a coroutine; '
                 '{} found'.format(type(behav)))
 
-        return ContextAwareTask(
-            self._wrap_exc(behav), self)
+        self.running_behaviors += 1
+        return ContextAwareTask(self._wrap_exc(behav), self)
 
     async def _wrap_exc(self, coro):
+        # Replies to asks made by the behavior rebind the task's envelope.
+        envelope = self.envelope
+        profiler = self._actor._profiler
+        if profiler is not None:
+            coro = profiler.steps(coro)
+            started = time.perf_counter()
         try:
             await coro
+            if self._actor._persistence is not None:
+                self._actor._persistence.checkpoint(self._actor)
         except Exception as e:
-            if self.envelope.req_token:
-                self.sender.reply(e)
+            if envelope.req_token is not None and isinstance(envelope.sender, ActorRef):
+                with self.msg_scope(envelope):
+                    envelope.sender.reply(ErrorForward(e))
+            self._actor._fail(e)
+        finally:
+            self.running_behaviors -= 1
+            if profiler is not None:
+                profiler.record(type(envelope.message), time.perf_counter() - started)
 
     def spawn(self, actor_type, *args, **kwargs):
         child = spawn(actor_type, *args, parent=self.ref, **kwargs)
         self.children.add(child)
         return child
 
+    def schedule_once(self, delay, message, target=None):
+        """Sends `message` to `target` (this actor by default) after `delay`
+        seconds. Returns a handle with a `cancel()` method."""
+        return self._schedule(delay, None, message, target)
+
+    def schedule_repeat(self, interval, message, target=None, initial_delay=None):
+        """Sends `message` to `target` every `interval` seconds until the
+        returned handle is cancelled or this actor dies or restarts."""
+        delay = interval if initial_delay is None else initial_delay
+        return self._schedule(delay, interval, message, target)
+
+    def _schedule(self, delay, interval, message, target):
+        timer = timer_wheel(self._loop).schedule(
+            delay, interval, target or self.ref, message, sender=self.ref, owner=self)
+        if self.timers is None:
+            self.timers = set([])
+        self.timers.add(timer)
+        return timer
+
+    def forget_timer(self, timer):
+        if self.timers is not None:
+            self.timers.discard(timer)
+
+    def cancel_timers(self):
+        if self.timers:
+            for timer in list(self.timers):
+                timer.cancel()
+
+    def subscribe(self, topic):
+        subscribe(self.ref, topic)
+
+    def unsubscribe(self, topic=None):
+        unsubscribe(self.ref, topic)
+
     def remove_child(self, child):
-        self.children.remove(child)
+        self.children.discard(child)
+        self.restart_stats.pop(child.actor_uuid, None)
+
+    def handle_failure(self, child, error):
+        """Applies this actor's supervisor strategy to a failed `child`.
+
+        A root actor supervises itself, in which case `child` is its own ref
+        and running out of restarts simply stops it.
+        """
+        strategy = type(self._actor).supervisor_strategy
+        if child.actor_uuid not in self.restart_stats:
+            self.restart_stats[child.actor_uuid] = RestartStats()
+        delay = strategy.next_restart(self.restart_stats[child.actor_uuid], self._loop.time())
+
+        if strategy.all_for_one and child in self.children:
+            targets = list(self.children)
+        else:
+            targets = [child]
+
+        if delay is None:
+            for target in targets:
+                target.tell(SystemMessage.kill(), sender=self.ref)
+            if child.actor_uuid != self.actor_uuid:
+                self._actor._fail(error)
+            return
+
+        for target in targets:
+            self._loop.call_later(
+                delay, partial(target.tell, SystemMessage.restart(), sender=self.ref))
@@ -0,0 +1,75 @@
+from threading import Lock
+
+from .mailbox import deliver_batch
+from .message import Envelope
+
+__all__ = (
+    'EventStream',
+)
+
+
+class EventStream(object):
+    """ Topic-indexed publish/subscribe among the actors of this process
+
+    A topic is either a message type, matched against the MRO of each
+    published message, or any other hashable key given explicitly to
+    `publish`. Each publication creates a single envelope and wakes every
+    loop that hosts subscribers once. Subscriptions end with the subscriber.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._subscribers = {}  # topic -> {actor uuid: ref}
+        self._topics = {}       # actor uuid -> set of topics
+        self._routes = {}       # topic -> {loop: [mailbox]}, rebuilt on demand
+
+    def subscribe(self, ref, topic):
+        with self._lock:
+            self._subscribers.setdefault(topic, {})[ref.actor_uuid] = ref
+            self._topics.setdefault(ref.actor_uuid, set()).add(topic)
+            self._routes.pop(topic, None)
+
+    def unsubscribe(self, ref, topic=None):
+        """Removes `ref` from `topic`, or from every topic if none is given."""
+        with self._lock:
+            topics = self._topics.get(ref.actor_uuid)
+            if not topics:
+                return
+            for t in ([topic] if topic is not None else list(topics)):
+                topics.discard(t)
+                subscribers = self._subscribers.get(t)
+                if subscribers is not None and subscribers.pop(ref.actor_uuid, None):
+                    self._routes.pop(t, None)
+                    if not subscribers:
+                        del self._subscribers[t]
+            if not topics:
+                del self._topics[ref.actor_uuid]
+
+    def _route(self, topic):
+        routes = self._routes.get(topic)
+        if routes is None:
+            with self._lock:
+                routes = {}
+                for ref in self._subscribers.get(topic, {}).values():
+                    routes.setdefault(ref._mailbox.loop, []).append(ref._mailbox)
+                self._routes[topic] = routes
+        return routes
+
+    def publish(self, message, topic=None, sender=None):
+        if topic is not None:
+            routes = self._route(topic)
+        else:
+            matched = [self._route(t) for t in type(message).mro() if t in self._subscribers]
+            if not matched:
+                return
+            routes = matched[0] if len(matched) == 1 else self._merge(matched)
+        deliver_batch(Envelope(message, sender), routes)
+
+    @staticmethod
+    def _merge(route_list):
+        # A subscriber to several matching types still gets one copy.
+        merged = {}
+        for routes in route_list:
+            for loop, mailboxes in routes.items():
+                merged.setdefault(loop, {}).update((id(m), m) for m in mailboxes)
+        return {loop: list(mailboxes.values()) for loop, mailboxes in merged.items()}
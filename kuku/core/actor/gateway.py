@@ -0,0 +1,189 @@
+from asyncio import wrap_future
+from concurrent.futures import Future, TimeoutError
+import heapq
+from threading import Condition, Lock, Thread
+import time
+from uuid import uuid4
+
+from .cluster import get_cluster
+from .message import Envelope, ErrorForward
+from .ref import ActorRef
+
+__all__ = (
+    'Gateway',
+    'get_gateway',
+)
+
+
+# Slot tokens carry a generation so that a late reply never settles the
+# request that reused its slot. Generations start at 1, so no token is 0.
+_GENERATION_BITS = 24
+_GENERATION_MASK = (1 << _GENERATION_BITS) - 1
+
+
+class _Slot(object):
+    __slots__ = ('index', 'generation', 'future')
+
+    def __init__(self, index):
+        self.index = index
+        self.generation = 1
+        self.future = None
+
+    @property
+    def token(self):
+        return (self.index << _GENERATION_BITS) | self.generation
+
+
+class GatewayMailbox(object):
+    """ Settles gateway requests right on the replying thread. """
+    __slots__ = ('_gateway', )
+
+    # Not bound to a loop; see `deliver_batch`.
+    loop = None
+
+    def __init__(self, gateway):
+        self._gateway = gateway
+
+    def put(self, envelope):
+        if envelope.resp_token is not None:
+            self._gateway.resolve(envelope.resp_token, envelope.message)
+
+
+class Gateway(object):
+    """ Lets any thread or foreign event loop talk to actors.
+
+    All requests share one reply endpoint, a ref registered in the cluster
+    like an actor, and are told apart by pooled correlation slots; nothing is
+    spawned per request. `ask` returns a `concurrent.futures.Future`, and
+    `ask_async` an awaitable for the calling thread's running loop. Timeouts
+    are enforced by a single reaper thread or, in a cluster whose loop is
+    driven by the caller (see `TestRuntime`), by that loop's clock.
+    """
+
+    default_timeout = 60
+
+    def __init__(self):
+        self._lock = Lock()
+        self._slots = []
+        self._free = []
+        self._deadlines = []
+        self._reaper_wakeup = Condition(self._lock)
+        self._reaper = None
+        self._loop = get_cluster().driven_loop
+        self.ref = ActorRef.from_mailbox(
+            GatewayMailbox(self), Gateway, 'gateway-{}'.format(uuid4()))
+        get_cluster().register_actor(self.ref)
+
+    def _acquire(self, future, deadline):
+        with self._lock:
+            if self._free:
+                slot = self._free.pop()
+            else:
+                slot = _Slot(len(self._slots))
+                self._slots.append(slot)
+            slot.future = future
+            token = slot.token
+            if deadline is None:
+                return token
+            if len(self._deadlines) > 2 * len(self._slots) + 1024:
+                self._compact()
+            heapq.heappush(self._deadlines, (deadline, token))
+            if self._reaper is None:
+                self._reaper = Thread(target=self._reap, daemon=True)
+                self._reaper.start()
+            elif self._deadlines[0][1] == token:
+                self._reaper_wakeup.notify()
+        return token
+
+    def _compact(self):
+        # Drops the deadlines of requests that were already answered.
+        slots = self._slots
+        self._deadlines = [
+            (deadline, token) for (deadline, token) in self._deadlines
+            if slots[token >> _GENERATION_BITS].token == token and
+            slots[token >> _GENERATION_BITS].future is not None]
+        heapq.heapify(self._deadlines)
+
+    def _release(self, token):
+        # Returns the pending future of `token`, freeing its slot.
+        index = token >> _GENERATION_BITS
+        with self._lock:
+            if index >= len(self._slots):
+                return None
+            slot = self._slots[index]
+            if slot.token != token or slot.future is None:
+                return None
+            future = slot.future
+            slot.future = None
+            slot.generation = (slot.generation + 1) & _GENERATION_MASK or 1
+            self._free.append(slot)
+        return future
+
+    def resolve(self, token, message):
+        if not isinstance(token, int):
+            return
+        future = self._release(token)
+        if future is None or not future.set_running_or_notify_cancel():
+            return
+        if isinstance(message, ErrorForward):
+            future.set_exception(message.error)
+        else:
+            future.set_result(message)
+
+    def _reap(self):
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                expired = []
+                while self._deadlines and self._deadlines[0][0] <= now:
+                    expired.append(heapq.heappop(self._deadlines)[1])
+                if expired:
+                    self._lock.release()
+                    try:
+                        for token in expired:
+                            self._expire(token)
+                    finally:
+                        self._lock.acquire()
+                    continue
+                timeout = self._deadlines[0][0] - now if self._deadlines else None
+                self._reaper_wakeup.wait(timeout)
+
+    def _expire(self, token):
+        future = self._release(token)
+        if future is not None and future.set_running_or_notify_cancel():
+            future.set_exception(TimeoutError())
+
+    def pending(self):
+        with self._lock:
+            return len(self._slots) - len(self._free)
+
+    def tell(self, ref, message):
+        ref.tell(message, sender=self.ref)
+
+    def ask(self, ref, message, timeout=None):
+        future = Future()
+        timeout = timeout or self.default_timeout
+        if self._loop is None:
+            token = self._acquire(future, time.monotonic() + timeout)
+        else:
+            token = self._acquire(future, None)
+            self._loop.call_later(timeout, self._expire, token)
+        ref._mailbox.put(Envelope(message, self.ref, req_token=token))
+        return future
+
+    def ask_async(self, ref, message, timeout=None):
+        return wrap_future(self.ask(ref, message, timeout))
+
+
+_gateway = None
+_gateway_lock = Lock()
+
+
+def get_gateway():
+    """Returns the gateway of the current cluster, creating it on first use."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None or _gateway.ref != get_cluster().get_actor_by_uuid(
+                _gateway.ref.actor_uuid):
+            _gateway = Gateway()
+        return _gateway
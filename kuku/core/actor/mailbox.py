@@ -1,19 +1,145 @@
 from asyncio import Queue
+from collections import deque
+from threading import Lock
 
 __all__ = (
     'Mailbox',
+    'LightMailbox',
+    'deliver_batch',
+    'deliver_each',
 )
 
 
 class Mailbox(object):
     """ Thread-safe asyncio queue """
 
-    def __init__(self, loop):
+    def __init__(self, loop, stats=None):
         self._loop = loop
         self._queue = Queue(loop=loop)
+        self.stats = stats  # LoopStats of `loop`, if the cluster keeps any
+
+    @property
+    def loop(self):
+        return self._loop
 
     def put(self, item):
         self._loop.call_soon_threadsafe(self._queue.put_nowait, item)
 
     async def get(self):
         return await self._queue.get()
+
+    # Batched delivery (see `deliver_batch`): `stage` runs on the sending
+    # thread and returns whether `flush` must then be called on the loop.
+
+    def stage(self, item):
+        return True
+
+    def flush(self, item):
+        self._queue.put_nowait(item)
+
+    def peek(self):
+        """Envelopes waiting in the queue, oldest first."""
+        return list(self._queue._queue)
+
+
+# Guards the lazy allocation of LightMailbox queues only.
+_alloc_lock = Lock()
+
+
+class LightMailbox(object):
+    """ Thread-safe mailbox which holds no queue and no task while idle.
+
+    Senders append directly to the queue, so ordering is fixed at `put` time,
+    and the owner is woken through `on_ready` only when it is not already
+    scheduled. The owner pops with `get_nowait` and calls `release` once it
+    finds the mailbox empty.
+    """
+    __slots__ = ('_loop', '_items', '_on_ready', '_scheduled', 'stats')
+
+    def __init__(self, loop, on_ready, stats=None):
+        self._loop = loop
+        self._items = None
+        self._on_ready = on_ready
+        self._scheduled = False
+        self.stats = stats
+
+    @property
+    def loop(self):
+        return self._loop
+
+    def __len__(self):
+        return len(self._items) if self._items is not None else 0
+
+    def put(self, item):
+        if self.stage(item):
+            self._loop.call_soon_threadsafe(self._on_ready)
+
+    def stage(self, item):
+        if self._items is None:
+            with _alloc_lock:
+                if self._items is None:
+                    self._items = deque()
+        self._items.append(item)
+        if not self._scheduled:
+            self._scheduled = True
+            return True
+        return False
+
+    def flush(self, item):
+        self._on_ready()
+
+    def get_nowait(self):
+        return self._items.popleft()
+
+    def peek(self):
+        return list(self._items) if self._items is not None else []
+
+    def release(self):
+        """Marks the owner idle; returns True if items arrived meanwhile."""
+        self._scheduled = False
+        return len(self) > 0
+
+    def move_to(self, loop, stats=None):
+        # Wake-ups already posted to the old loop are forwarded by the owner.
+        self._loop = loop
+        self.stats = stats
+
+
+def _flush_all(item, mailboxes):
+    for mailbox in mailboxes:
+        mailbox.flush(item)
+
+
+def _flush_each(deliveries):
+    for (mailbox, item) in deliveries:
+        mailbox.flush(item)
+
+
+def deliver_batch(item, mailboxes_by_loop):
+    """Puts the same `item` into many mailboxes with one wake-up per loop.
+
+    `mailboxes_by_loop` maps each loop to the mailboxes living on it; the
+    ``None`` key holds mailboxes without a local loop (process or remote
+    actors), which are sent to one by one.
+    """
+    for loop, mailboxes in mailboxes_by_loop.items():
+        if loop is None:
+            for mailbox in mailboxes:
+                mailbox.put(item)
+            continue
+        staged = [mailbox for mailbox in mailboxes if mailbox.stage(item)]
+        if staged:
+            loop.call_soon_threadsafe(_flush_all, item, staged)
+
+
+def deliver_each(deliveries_by_loop):
+    """Like `deliver_batch`, but with an item of its own per mailbox:
+    `deliveries_by_loop` maps each loop to (mailbox, item) pairs."""
+    for loop, deliveries in deliveries_by_loop.items():
+        if loop is None:
+            for (mailbox, item) in deliveries:
+                mailbox.put(item)
+            continue
+        staged = [(mailbox, item) for (mailbox, item) in deliveries if mailbox.stage(item)]
+        if staged:
+            loop.call_soon_threadsafe(_flush_each, staged)
@@ -1,6 +1,7 @@
 __all__ = (
     'SystemMessage',
     'ErrorForward',
+    'CacheInvalidate',
     'Envelope'
 )
 
@@ -14,8 +15,21 @@ class SystemMessage(object):
         self.kwargs = kwargs
 
     @staticmethod
-    def kill():
-        return SystemMessage('kill')
+    def kill(forget_state=False):
+        # `forget_state` also deletes the actor's checkpoint; see `enable_persistence`.
+        return SystemMessage('kill', forget_state=forget_state)
+
+    @staticmethod
+    def restart():
+        return SystemMessage('restart')
+
+    @staticmethod
+    def failed(error):
+        return SystemMessage('failed', error)
+
+    @staticmethod
+    def terminated():
+        return SystemMessage('terminated')
 
 
 class ErrorForward(object):
@@ -25,6 +39,16 @@ class ErrorForward(object):
         self.error = error
 
 
+class CacheInvalidate(object):
+    """Drops cached results of the `cacheable` behavior named `behavior`
+    (all of them if None), only for `key` if given."""
+    __slots__ = ('behavior', 'key')
+
+    def __init__(self, behavior=None, key=None):
+        self.behavior = behavior
+        self.key = key
+
+
 class Envelope(object):
     __slots__ = (
         'message',    # Contents of the envelope
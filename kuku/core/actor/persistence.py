@@ -0,0 +1,100 @@
+import pickle
+
+from kuku.state_log import StateLog
+from .base import logger, type_path
+from .cluster import get_cluster
+
+__all__ = (
+    'enable_persistence',
+)
+
+
+def enable_persistence(path, **options):
+    """Checkpoints actors that declare `persistent_state` to the log at
+    `path` from now on. Returns the StateLog.
+
+    A checkpoint outlives its actor, so that a restarted process picks it up,
+    unless the actor is killed with `SystemMessage.kill(forget_state=True)`."""
+    cluster = get_cluster()
+    cluster.state_log = StateLog(path, **options)
+    return cluster.state_log
+
+
+def track_state(actor, name, value):
+    # `__setattr__` of actor types with `persistent_state`.
+    object.__setattr__(actor, name, value)
+    persistence = actor._persistence
+    if persistence is not None and name in actor.persistent_state:
+        persistence.dirty.add(name)
+
+
+class Persistence(object):
+    """ Checkpoints the `persistent_state` attributes of one actor.
+
+    State is restored lazily, right before the first message is processed,
+    and written after every message that assigned one of the attributes
+    (see `AsyncActor.mark_dirty` for changes made in place). Attributes are
+    pickled one by one, so only the assigned ones are pickled again. The
+    checkpoint is deleted only by a kill that asks for it.
+    """
+    __slots__ = ('log', 'key', 'restored', 'dirty', 'pickled', 'discard')
+
+    def __init__(self, log, key):
+        self.log = log
+        self.key = key
+        self.restored = False
+        self.dirty = set()
+        self.pickled = {}  # name -> pickled value, as last checkpointed
+        self.discard = False
+
+    @staticmethod
+    def attach(actor):
+        log = get_cluster().state_log
+        if log is None:
+            return None
+        key = actor.persistence_key()
+        if key is None:
+            return None
+        return Persistence(log, (type_path(type(actor)), key))
+
+    def restore(self, actor):
+        self.restored = True
+        data = self.log.get(self.key)
+        if data is None:
+            self.pickled = {name: _dump(getattr(actor, name, None))
+                            for name in actor.persistent_state}
+            self.dirty.clear()
+            return
+        try:
+            pickled = pickle.loads(data)
+            state = {name: pickle.loads(value) for (name, value) in pickled.items()}
+        except Exception as e:
+            logger.error('Cannot restore {}'.format(self.key), exc_info=e)
+            return
+        for (name, value) in state.items():
+            setattr(actor, name, value)
+        self.pickled = pickled
+        self.dirty.clear()
+        actor.after_restore()
+
+    def checkpoint(self, actor):
+        if not self.restored or not self.dirty:
+            # Restarted meanwhile, its state is only valid once restored; or
+            # nothing was assigned.
+            return
+        changed = False
+        for name in self.dirty:
+            value = _dump(getattr(actor, name, None))
+            if value != self.pickled.get(name):
+                self.pickled[name] = value
+                changed = True
+        self.dirty.clear()
+        if changed:
+            self.log.put(self.key, pickle.dumps(self.pickled, pickle.HIGHEST_PROTOCOL))
+
+    def forget(self):
+        self.log.delete(self.key)
+
+
+def _dump(value):
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
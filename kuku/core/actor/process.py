@@ -0,0 +1,201 @@
+import multiprocessing
+import os
+from threading import Lock, Thread
+import time
+from uuid import uuid4
+
+from .base import logger
+from .cluster import get_actor_by_uuid, spawn
+from .message import Envelope
+from .ref import ActorRef
+from .wire import Channel, encode_envelope, OP_ENVELOPE, OP_SPAWN
+
+__all__ = (
+    'ProcessPool',
+)
+
+
+def _sender_id(sender, local_ids=None):
+    if not isinstance(sender, ActorRef):
+        return None
+    if local_ids is not None:
+        return local_ids.get(sender.actor_uuid, sender.actor_uuid)
+    return sender.actor_uuid
+
+
+class ChannelMailbox(object):
+    """ Mailbox of an actor living on the other side of a Channel """
+    __slots__ = ('_endpoint', '_actor_id')
+
+    loop = None
+
+    def __init__(self, endpoint, actor_id):
+        self._endpoint = endpoint
+        self._actor_id = actor_id
+
+    def put(self, envelope):
+        self._endpoint.send_envelope(self._actor_id, envelope)
+
+
+class WorkerHandle(object):
+    """Parent side of one worker process; restarts it when it dies."""
+
+    restart_backoff = 0.5
+
+    def __init__(self, mp_context):
+        self._mp_context = mp_context
+        self._specs = {}  # actor id -> (actor_type, args, kwargs)
+        self._lock = Lock()
+        self._closed = False
+        self.restarts = 0
+        self._start()
+        self._reader = Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+
+    def __len__(self):
+        return len(self._specs)
+
+    def _start(self):
+        parent_conn, child_conn = self._mp_context.Pipe()
+        self.process = self._mp_context.Process(
+            target=worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.channel = Channel(parent_conn)
+        for actor_id, spec in self._specs.items():
+            self.channel.send((OP_SPAWN, actor_id) + spec)
+
+    def host(self, actor_id, actor_type, args, kwargs):
+        with self._lock:
+            self._specs[actor_id] = (actor_type, args, kwargs)
+            self.channel.send((OP_SPAWN, actor_id, actor_type, args, kwargs))
+
+    def send_envelope(self, actor_id, envelope):
+        try:
+            self.channel.send(encode_envelope(
+                actor_id, envelope, _sender_id(envelope.sender)))
+        except (OSError, EOFError):
+            # Worker is restarting; pending asks time out as usual.
+            pass
+
+    def _read_loop(self):
+        while True:
+            try:
+                frame = self.channel.recv()
+            except (OSError, EOFError):
+                if self._closed:
+                    return
+                self._restart()
+                continue
+            if frame[0] == OP_ENVELOPE:
+                _deliver_to_parent(*frame[1:])
+
+    def _restart(self):
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        logger.warning('Worker process {} exited with {}; restarting'.format(
+            self.process.pid, self.process.exitcode))
+        self.channel.close()
+        time.sleep(self.restart_backoff)
+        with self._lock:
+            self.restarts += 1
+            self._start()
+
+    def close(self):
+        # Closing our end does not wake the reader thread blocked on it, so
+        # the worker would never see EOF; it holds nothing worth a clean exit.
+        self._closed = True
+        self.process.terminate()
+        self.process.join()
+        self.channel.close()
+
+
+def _deliver_to_parent(target_id, sender_id, req_token, resp_token, message):
+    target = get_actor_by_uuid(target_id)
+    if target is None:
+        return
+    sender = ActorRef.nobody
+    if sender_id is not None:
+        sender = get_actor_by_uuid(sender_id) or ActorRef.nobody
+    target._mailbox.put(Envelope(message, sender, req_token, resp_token))
+
+
+class ProcessPool(object):
+    """ Hosts isolated actors in worker processes
+
+    Each isolated actor lives in one worker, spawned there through the
+    worker's own ActorCluster. The parent only holds an ActorRef whose mailbox
+    forwards envelopes over the worker's Channel, so tell/ask/reply and RPC
+    calls behave as for local actors. Replies and messages from the worker
+    are routed back by actor id through the parent's registry. Actor types,
+    their init arguments and messages must be picklable.
+
+    When a worker dies it is restarted and its actors are spawned again from
+    their original arguments, keeping their refs; their state is lost.
+    """
+
+    def __init__(self, size):
+        mp_context = multiprocessing.get_context('spawn')
+        self._workers = [WorkerHandle(mp_context) for _ in range(size)]
+
+    @property
+    def restarts(self):
+        return sum(worker.restarts for worker in self._workers)
+
+    def host(self, actor_type, args, kwargs):
+        worker = min(self._workers, key=len)
+        actor_id = uuid4()
+        worker.host(actor_id, actor_type, args, kwargs)
+        return ActorRef.from_mailbox(
+            ChannelMailbox(worker, actor_id), actor_type, actor_id)
+
+    def close(self):
+        for worker in self._workers:
+            worker.close()
+
+
+class _Worker(object):
+    """Child side of a worker process."""
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.hosted = {}     # parent-assigned id -> local ref
+        self.local_ids = {}  # local uuid -> parent-assigned id
+
+    def serve(self):
+        while True:
+            try:
+                frame = self.channel.recv()
+            except (OSError, EOFError):
+                return
+            if frame[0] == OP_SPAWN:
+                self.spawn(*frame[1:])
+            elif frame[0] == OP_ENVELOPE:
+                self.deliver(*frame[1:])
+
+    def spawn(self, actor_id, actor_type, args, kwargs):
+        ref = spawn(actor_type, *args, isolated=False, **kwargs)
+        self.hosted[actor_id] = ref
+        self.local_ids[ref.actor_uuid] = actor_id
+
+    def deliver(self, target_id, sender_id, req_token, resp_token, message):
+        target = self.hosted.get(target_id)
+        if target is None:
+            return
+        sender = ActorRef.nobody
+        if sender_id is not None:
+            sender = self.hosted.get(sender_id) or ActorRef.from_mailbox(
+                ChannelMailbox(self, sender_id), None, sender_id)
+        target._mailbox.put(Envelope(message, sender, req_token, resp_token))
+
+    def send_envelope(self, actor_id, envelope):
+        self.channel.send(encode_envelope(
+            actor_id, envelope, _sender_id(envelope.sender, self.local_ids)))
+
+
+def worker_main(conn):
+    _Worker(Channel(conn)).serve()
+    # The parent is gone; loop threads of this process's cluster never exit.
+    os._exit(0)
@@ -1,4 +1,4 @@
-from asyncio import get_event_loop, Task
+from asyncio import current_task, get_event_loop, get_running_loop
 from functools import partial
 
 from .message import Envelope
@@ -8,24 +8,70 @@ __all__ = (
 )
 
 
+def _current_task():
+    try:
+        return current_task()
+    except RuntimeError:
+        # A plain thread without a running loop.
+        return None
+
+
+def current_actor_task(actor_ctx):
+    """Returns the running task if it runs code of the actor of `actor_ctx`."""
+    task = _current_task()
+    return task if getattr(task, 'actor_ctx', None) is actor_ctx else None
+
+
 def get_context_or_error():
-    return Task.current_task().actor_ctx
+    return current_task().actor_ctx
 
 
 def get_context_or_none():
-    return getattr(Task.current_task(), 'actor_ctx', None)
+    return getattr(_current_task(), 'actor_ctx', None)
+
+
+def _ask_from_outside(ref, message, sender, timeout):
+    if sender is not None:
+        # The gateway is the sender of the request, or its reply is lost.
+        raise TypeError('ask() outside of actors cannot take a sender; '
+                        'the reply goes to the gateway')
+    from .gateway import get_gateway
+    gateway = get_gateway()
+    try:
+        get_running_loop()
+    except RuntimeError:
+        return gateway.ask(ref, message, timeout)
+    return gateway.ask_async(ref, message, timeout)
 
 
 class ActorRef(object):
+    __slots__ = ('_mailbox', '_msg_types', 'actor_type', 'actor_uuid')
+
     nobody = object()
 
     def __init__(self, actor):
         self._mailbox = actor.mailbox
-        self._msg_types = {behav.__name__: msg_type
-                           for (msg_type, behav) in actor.behaviors.items()}
+        self._msg_types = actor.msg_types
         self.actor_type = type(actor)
         self.actor_uuid = actor.uuid
 
+    @classmethod
+    def from_mailbox(cls, mailbox, actor_type, actor_uuid):
+        """Creates a ref to an actor that does not live in this thread's
+        cluster, e.g. in a worker process, given a mailbox that forwards to it."""
+        ref = cls.__new__(cls)
+        ref._mailbox = mailbox
+        ref._msg_types = getattr(actor_type, 'msg_types', {})
+        ref.actor_type = actor_type
+        ref.actor_uuid = actor_uuid
+        return ref
+
+    def __eq__(self, other):
+        return isinstance(other, ActorRef) and self.actor_uuid == other.actor_uuid
+
+    def __hash__(self):
+        return hash(self.actor_uuid)
+
     def tell(self, message, *, sender=None):
         if sender is None:
             ctx = get_context_or_none()
@@ -35,10 +81,14 @@ class ActorRef(object):
         self._mailbox.put(envelope)
 
     def ask(self, message, *, sender=None, timeout=None):
-        loop = get_event_loop()  
+        ctx = get_context_or_none()
+        if ctx is None:
+            # Outside of actors; see `Gateway.ask`.
+            return _ask_from_outside(self, message, sender, timeout)
+
+        loop = get_event_loop()
         fut = loop.create_future()
 
-        ctx = get_context_or_error()
         sender = sender or ctx.ref
         timeout = timeout or ctx.default_timeout
         req_token = ctx.issue_req_token(fut, timeout)
@@ -0,0 +1,273 @@
+from asyncio import new_event_loop, Protocol, run_coroutine_threadsafe, set_event_loop
+from threading import Lock, Thread
+from uuid import uuid4
+
+from .base import logger, resolve_type, type_path
+from .cluster import get_actor_by_uuid, get_cluster
+from .message import Envelope
+from .ref import ActorRef
+from .wire import (encode_envelope, FrameReader, pack_frame,
+                   OP_ENVELOPE, OP_HELLO, OP_REGISTER, OP_UNREGISTER)
+
+__all__ = (
+    'Node',
+    'start_node',
+)
+
+
+class RemoteMailbox(object):
+    """ Mailbox of an actor on another node; survives reconnects """
+    __slots__ = ('_node', 'node_id', '_actor_id')
+
+    loop = None
+
+    def __init__(self, node, node_id, actor_id):
+        self._node = node
+        self.node_id = node_id
+        self._actor_id = actor_id
+
+    def put(self, envelope):
+        self._node.send_envelope(self.node_id, self._actor_id, envelope)
+
+
+def _announced(ref):
+    # Local actors whose type opted in; see `AsyncActor.announced`.
+    return (getattr(ref.actor_type, 'announced', False) and
+            not isinstance(ref._mailbox, RemoteMailbox))
+
+
+class PeerProtocol(Protocol):
+    """ One persistent connection to another node
+
+    Frames are serialized by the sending thread and queued; a single flush
+    per loop iteration writes everything queued so far in one call.
+    """
+
+    def __init__(self, node, address=None):
+        self.node = node
+        self.address = address  # set if this side initiated the connection
+        self.node_id = None
+        self.listen_address = None
+        self.transport = None
+        self._reader = FrameReader()
+        self._outbox = []
+        self._outbox_lock = Lock()
+        self._flush_scheduled = False
+
+    @property
+    def initiator(self):
+        return self.node.node_id if self.address is not None else self.node_id
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.send((OP_HELLO, self.node.node_id, self.node.address, self.node.peer_addresses()))
+
+    def data_received(self, data):
+        for frame in self._reader.feed(data):
+            self.node.handle_frame(self, frame)
+
+    def connection_lost(self, exc):
+        self.node.peer_lost(self)
+
+    def send(self, frame):
+        data = pack_frame(frame)
+        with self._outbox_lock:
+            self._outbox.append(data)
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        self.node.loop.call_soon_threadsafe(self._flush)
+
+    def _flush(self):
+        with self._outbox_lock:
+            chunks, self._outbox = self._outbox, []
+            self._flush_scheduled = False
+        if not self.transport.is_closing():
+            self.transport.write(b''.join(chunks))
+
+
+class Node(object):
+    """ Makes this process one node of a multi-node actor cluster
+
+    Nodes keep one persistent connection to each other over TCP (address is
+    a ``(host, port)`` tuple) or Unix sockets (address is a path). Every node
+    announces its actors of types with ``announced = True``, so `get_actors`
+    and `get_actor_by_uuid` also return refs to them on other nodes; any other
+    actor is reachable through refs sent to other nodes, e.g. as the sender
+    of a message, without being mirrored anywhere. tell/ask/reply and
+    `ErrorForward` work through remote refs unchanged. Actor ids
+    are only unique within a node (lightweight actors are numbered), so the
+    `actor_uuid` of a ref to a remote actor is ``(node id, actor id)``. Actor
+    types must be importable on every node and messages picklable. Frames
+    are pickled, so only connect nodes on a trusted network.
+    """
+
+    reconnect_delay = 1.0
+
+    def __init__(self, cluster, address=None):
+        self.node_id = uuid4().hex
+        self.address = address
+        self._cluster = cluster
+        self._peers = {}   # node id -> PeerProtocol
+        self._remote = {}  # (node id, actor id) -> ref
+        self._lock = Lock()
+
+        self.loop = new_event_loop()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+        if address is not None:
+            self._call(self._listen(address))
+
+    def _run(self):
+        set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def _call(self, coro):
+        return run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def _listen(self, address):
+        if isinstance(address, str):
+            return await self.loop.create_unix_server(lambda: PeerProtocol(self), address)
+        host, port = address
+        return await self.loop.create_server(lambda: PeerProtocol(self), host, port)
+
+    async def _connect(self, address):
+        factory = lambda: PeerProtocol(self, address)
+        if isinstance(address, str):
+            return await self.loop.create_unix_connection(factory, address)
+        host, port = address
+        return await self.loop.create_connection(factory, host, port)
+
+    def join(self, address):
+        """Connects to the node at `address`, and through it to its peers."""
+        self._call(self._connect(address))
+
+    def _join_later(self, address, delay):
+        async def retry():
+            try:
+                await self._connect(address)
+            except OSError:
+                self._join_later(address, min(delay * 2, 30))
+        self.loop.call_later(delay, self.loop.create_task, retry())
+
+    def peer_addresses(self):
+        return [(node_id, peer.listen_address)
+                for node_id, peer in list(self._peers.items())
+                if peer.listen_address is not None]
+
+    def handle_frame(self, peer, frame):
+        op = frame[0]
+        if op == OP_ENVELOPE:
+            self._deliver(peer, *frame[1:])
+        elif op == OP_REGISTER:
+            self._register_remote(peer.node_id, *frame[1:])
+        elif op == OP_UNREGISTER:
+            self._unregister_remote(peer.node_id, frame[1])
+        elif op == OP_HELLO:
+            self._hello(peer, *frame[1:])
+
+    def _hello(self, peer, node_id, listen_address, peers):
+        peer.node_id = node_id
+        peer.listen_address = listen_address
+        with self._lock:
+            existing = self._peers.get(node_id)
+            # Both sides may connect at once; both keep the connection that
+            # was initiated by the smaller node id.
+            if existing is not None and existing.initiator <= peer.initiator:
+                peer.transport.close()
+                return
+            self._peers[node_id] = peer
+        if existing is not None:
+            existing.transport.close()
+
+        for ref in self._cluster.all_actors():
+            if _announced(ref):
+                peer.send((OP_REGISTER, ref.actor_uuid, type_path(ref.actor_type)))
+        for other_id, address in peers:
+            if other_id != self.node_id and other_id not in self._peers:
+                self._join_later(address, 0)
+
+    def peer_lost(self, peer):
+        with self._lock:
+            if self._peers.get(peer.node_id) is not peer:
+                return
+            del self._peers[peer.node_id]
+        for (node_id, actor_id) in list(self._remote):
+            if node_id == peer.node_id:
+                self._unregister_remote(node_id, actor_id)
+        if peer.address is not None:
+            self._join_later(peer.address, self.reconnect_delay)
+
+    def _register_remote(self, node_id, actor_id, path):
+        if (node_id, actor_id) in self._remote:
+            return
+        try:
+            actor_type = resolve_type(path)
+        except (ImportError, AttributeError):
+            logger.warning('Cannot resolve remote actor type {}'.format(path))
+            return
+        ref = ActorRef.from_mailbox(
+            RemoteMailbox(self, node_id, actor_id), actor_type, (node_id, actor_id))
+        self._remote[(node_id, actor_id)] = ref
+        self._cluster.register_actor(ref)
+
+    def _unregister_remote(self, node_id, actor_id):
+        ref = self._remote.pop((node_id, actor_id), None)
+        if ref is not None:
+            self._cluster.unregister_actor(ref)
+
+    def announce(self, ref):
+        if _announced(ref):
+            self._broadcast((OP_REGISTER, ref.actor_uuid, type_path(ref.actor_type)))
+
+    def retract(self, ref):
+        if _announced(ref):
+            self._broadcast((OP_UNREGISTER, ref.actor_uuid))
+
+    def _broadcast(self, frame):
+        for peer in list(self._peers.values()):
+            peer.send(frame)
+
+    def send_envelope(self, node_id, actor_id, envelope):
+        peer = self._peers.get(node_id)
+        if peer is not None:
+            # Otherwise the node is gone; pending asks time out as usual.
+            peer.send(encode_envelope(actor_id, envelope, self._encode_sender(envelope.sender)))
+
+    def _encode_sender(self, sender):
+        if not isinstance(sender, ActorRef):
+            return None
+        if isinstance(sender._mailbox, RemoteMailbox):
+            return sender._mailbox.node_id, sender._mailbox._actor_id
+        return self.node_id, sender.actor_uuid
+
+    def _decode_sender(self, sender):
+        if sender is None:
+            return ActorRef.nobody
+        node_id, actor_id = sender
+        if node_id == self.node_id:
+            return get_actor_by_uuid(actor_id) or ActorRef.nobody
+        ref = self._remote.get((node_id, actor_id))
+        if ref is None:
+            # Not announced (e.g. an ephemeral endpoint); reachable all the same.
+            ref = ActorRef.from_mailbox(
+                RemoteMailbox(self, node_id, actor_id), None, (node_id, actor_id))
+        return ref
+
+    def _deliver(self, peer, target_id, sender, req_token, resp_token, message):
+        target = get_actor_by_uuid(target_id)
+        if target is None:
+            return
+        target._mailbox.put(Envelope(
+            message, self._decode_sender(sender), req_token, resp_token))
+
+
+def start_node(address=None, join=()):
+    """Starts this process's node, listening on `address` if given, and
+    joins the nodes at the addresses in `join`."""
+    cluster = get_cluster()
+    if cluster.node is None:
+        cluster.node = Node(cluster, address)
+    for peer_address in join:
+        cluster.node.join(peer_address)
+    return cluster.node
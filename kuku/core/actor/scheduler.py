@@ -0,0 +1,173 @@
+from asyncio import get_running_loop
+from math import ceil
+
+__all__ = (
+    'TimerWheel',
+    'ScheduledMessage',
+)
+
+
+def _runs_on(loop):
+    try:
+        return get_running_loop() is loop
+    except RuntimeError:
+        # A plain thread without a running loop.
+        return False
+
+
+class ScheduledMessage(object):
+    """ Handle of a delayed or periodic message; `cancel()` is thread-safe """
+    __slots__ = ('wheel', 'expires', 'interval', 'target', 'message', 'sender',
+                 'owner', 'bucket', 'level', 'cancelled')
+
+    def __init__(self, wheel, expires, interval, target, message, sender, owner):
+        self.wheel = wheel
+        self.expires = expires    # absolute tick
+        self.interval = interval  # in ticks, None for one-shot messages
+        self.target = target
+        self.message = message
+        self.sender = sender
+        self.owner = owner        # ActorContext that keeps track of its timers
+        self.bucket = None
+        self.level = None
+        self.cancelled = False
+
+    def cancel(self):
+        if self.cancelled:
+            return
+        self.cancelled = True
+        if self.owner is not None:
+            self.owner.forget_timer(self)
+        if _runs_on(self.wheel.loop):
+            self.wheel.remove(self)
+        else:
+            self.wheel.loop.call_soon_threadsafe(self.wheel.remove, self)
+
+
+class TimerWheel(object):
+    """ Hierarchical timing wheel driving the scheduled messages of one loop
+
+    `levels` wheels of `2 ** bits` slots each; a timer lives in the lowest
+    level whose span covers its remaining ticks and is cascaded down as that
+    level turns. Insertion and cancellation are O(1), and the loop is only
+    woken for ticks that have something to fire or cascade. With the
+    defaults (10 ms ticks, 4 levels of 256 slots) timers can reach ~497 days.
+    `schedule` and `ScheduledMessage.cancel` can be called from any thread,
+    e.g. from `before_start` in the spawning thread; the rest runs on the
+    loop's thread.
+    """
+
+    def __init__(self, loop, tick=0.01, bits=8, levels=4):
+        self.loop = loop
+        self._tick = tick
+        self._bits = bits
+        self._mask = (1 << bits) - 1
+        self._levels = levels
+        self._wheels = [[None] * (1 << bits) for _ in range(levels)]
+        self._counts = [0] * levels
+        self._start = loop.time()
+        self._current = 0
+        self._handle = None
+        self._wake_tick = 0
+
+    def __len__(self):
+        return sum(self._counts)
+
+    def schedule(self, delay, interval, target, message, sender=None, owner=None):
+        timer = ScheduledMessage(
+            self, ceil((self.loop.time() + delay - self._start) / self._tick),
+            max(int(round(interval / self._tick)), 1) if interval is not None else None,
+            target, message, sender, owner)
+        if _runs_on(self.loop):
+            self._insert(timer)
+        else:
+            self.loop.call_soon_threadsafe(self._insert, timer)
+        return timer
+
+    def _insert(self, timer):
+        if timer.cancelled:
+            return
+        if not len(self):
+            self._current = max(self._current, int((self.loop.time() - self._start) / self._tick))
+        timer.expires = max(timer.expires, self._current + 1)
+        self._place(timer)
+        self._wake_up()
+
+    def remove(self, timer):
+        if timer.bucket is not None:
+            del timer.bucket[timer]
+            self._counts[timer.level] -= 1
+            timer.bucket = None
+
+    def _place(self, timer):
+        remaining = timer.expires - self._current
+        level = 0
+        while level < self._levels - 1 and remaining >> (self._bits * (level + 1)):
+            level += 1
+        slot = (timer.expires >> (self._bits * level)) & self._mask
+        bucket = self._wheels[level][slot]
+        if bucket is None:
+            bucket = self._wheels[level][slot] = {}
+        bucket[timer] = None
+        timer.bucket = bucket
+        timer.level = level
+        self._counts[level] += 1
+
+    def _take(self, level, slot):
+        bucket = self._wheels[level][slot]
+        if not bucket:
+            return ()
+        self._wheels[level][slot] = None
+        self._counts[level] -= len(bucket)
+        for timer in bucket:
+            timer.bucket = None
+        return bucket
+
+    def _next_tick(self):
+        # Ticks before the next cascade have nothing to do while level 0 is empty.
+        if self._counts[0]:
+            return self._current + 1
+        return ((self._current >> self._bits) + 1) << self._bits
+
+    def _wake_up(self):
+        tick = self._next_tick()
+        if self._handle is not None:
+            if self._wake_tick <= tick:
+                return
+            self._handle.cancel()
+        self._wake_tick = tick
+        self._handle = self.loop.call_at(self._start + tick * self._tick, self._advance)
+
+    def _advance(self):
+        self._handle = None
+        # The loop may run us marginally before the requested time.
+        now = max(int((self.loop.time() - self._start) / self._tick), self._wake_tick)
+        while self._current < now and len(self):
+            self._current = min(self._next_tick(), now) - 1
+            self._step()
+        self._current = max(self._current, now)
+        if len(self):
+            self._wake_up()
+
+    def _step(self):
+        self._current += 1
+        tick = self._current
+
+        level = 1
+        while level < self._levels and not tick & ((1 << (self._bits * level)) - 1):
+            for timer in self._take(level, (tick >> (self._bits * level)) & self._mask):
+                self._place(timer)
+            level += 1
+
+        for timer in self._take(0, tick & self._mask):
+            self._fire(timer)
+
+    def _fire(self, timer):
+        if timer.cancelled:
+            return
+        if timer.interval is not None:
+            timer.expires = max(timer.expires + timer.interval, self._current + 1)
+            self._place(timer)
+        elif timer.owner is not None:
+            timer.owner.forget_timer(timer)
+        timer.target.tell(timer.message, sender=timer.sender)
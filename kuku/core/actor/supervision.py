@@ -0,0 +1,55 @@
+__all__ = (
+    'SupervisorStrategy',
+    'OneForOne',
+    'AllForOne',
+)
+
+
+class RestartStats(object):
+    __slots__ = ('restarts', 'window_start', 'window_restarts')
+
+    def __init__(self):
+        self.restarts = 0
+        self.window_start = None
+        self.window_restarts = 0
+
+
+class SupervisorStrategy(object):
+    """ Decides how a parent reacts to the failure of a child
+
+    A failed child is restarted in place after an exponential backoff,
+    starting at `min_backoff` and capped at `max_backoff`. If it fails more
+    than `max_restarts` times within `within` seconds it is stopped instead
+    and the failure escalates to the parent's own supervisor.
+    """
+
+    all_for_one = False
+
+    def __init__(self, max_restarts=10, within=60, min_backoff=0.1, max_backoff=30):
+        self.max_restarts = max_restarts
+        self.within = within
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+
+    def next_restart(self, stats, now):
+        """Returns the delay before the next restart, or None to give up."""
+        if stats.window_start is None or now - stats.window_start > self.within:
+            stats.window_start = now
+            stats.window_restarts = 0
+
+        stats.window_restarts += 1
+        if stats.window_restarts > self.max_restarts:
+            return None
+
+        stats.restarts += 1
+        return min(self.min_backoff * 2 ** (stats.window_restarts - 1), self.max_backoff)
+
+
+class OneForOne(SupervisorStrategy):
+    """Restarts only the child that failed."""
+    all_for_one = False
+
+
+class AllForOne(SupervisorStrategy):
+    """Restarts every child when one of them fails."""
+    all_for_one = True
@@ -0,0 +1,255 @@
+from asyncio import all_tasks, base_events, events, wrap_future
+from concurrent.futures import Future
+from functools import partial
+import heapq
+from random import Random
+
+from .actor import AsyncActor
+from .base import behavior
+from .cluster import ActorCluster, ActorRegistry, spawn
+
+__all__ = (
+    'VirtualTimeLoop',
+    'TestRuntime',
+    'Probe',
+)
+
+
+def _owner(handle):
+    callback = handle._callback
+    while isinstance(callback, partial):
+        callback = callback.func
+    return getattr(callback, '__self__', callback)
+
+
+class VirtualTimeLoop(base_events.BaseEventLoop):
+    """ Event loop with a virtual clock, driven from the calling thread.
+
+    Time only moves in `advance()`, or in `run_until_complete()` when nothing
+    is ready, where it jumps straight to the next timer. With a `seed`, the
+    callbacks that are ready together run in a seeded random order, keeping
+    the order of callbacks bound to the same object (a task, an actor, a
+    queue), so each seed replays one interleaving of concurrent actors.
+    """
+
+    def __init__(self, seed=None):
+        super().__init__()
+        self._time = 0.0
+        self._random = Random(seed) if seed is not None else None
+
+    def time(self):
+        return self._time
+
+    def _write_to_self(self):
+        pass
+
+    def _process_events(self, event_list):
+        pass
+
+    def _next_timer(self):
+        while self._scheduled and self._scheduled[0]._cancelled:
+            self._timer_cancelled_count -= 1
+            heapq.heappop(self._scheduled)._scheduled = False
+        return self._scheduled[0]._when if self._scheduled else None
+
+    def _collect_due(self):
+        while self._next_timer() is not None and self._scheduled[0]._when <= self._time:
+            handle = heapq.heappop(self._scheduled)
+            handle._scheduled = False
+            self._ready.append(handle)
+
+    def _interleave(self, handles):
+        queues = {}
+        for handle in handles:
+            queues.setdefault(id(_owner(handle)), []).append(handle)
+        queues = [list(reversed(q)) for q in queues.values()]
+        ordered = []
+        while queues:
+            i = self._random.randrange(len(queues))
+            ordered.append(queues[i].pop())
+            if not queues[i]:
+                queues[i] = queues[-1]
+                queues.pop()
+        return ordered
+
+    def _run_ready(self):
+        handles = [self._ready.popleft() for _ in range(len(self._ready))]
+        if self._random is not None:
+            handles = self._interleave(handles)
+        for handle in handles:
+            if not handle._cancelled:
+                handle._run()
+
+    def _run_once(self):
+        # Called by run_forever(); never blocks.
+        self._collect_due()
+        if not self._ready and not self._stopping:
+            when = self._next_timer()
+            if when is None:
+                raise RuntimeError('Nothing left to run; the awaited future never completes')
+            self._time = max(self._time, when)
+            self._collect_due()
+        self._run_ready()
+
+    def step(self):
+        """Runs the callbacks that are ready now, without moving time.
+        Returns False if there were none."""
+        self._collect_due()
+        if not self._ready:
+            return False
+        running = events._get_running_loop()
+        events._set_running_loop(self)
+        try:
+            self._run_ready()
+        finally:
+            events._set_running_loop(running)
+        return True
+
+    def run_until_idle(self):
+        """Runs until nothing is ready without moving time."""
+        while self.step():
+            pass
+
+    def advance(self, seconds):
+        """Moves time forward by `seconds`, firing every timer due meanwhile
+        at its own time."""
+        target = self._time + seconds
+        self.run_until_idle()
+        while True:
+            when = self._next_timer()
+            if when is None or when > target:
+                break
+            self._time = max(self._time, when)
+            self.run_until_idle()
+        self._time = target
+        self.run_until_idle()
+
+
+class _Ask(object):
+    __slots__ = ('target', 'message', 'timeout', 'future')
+
+    def __init__(self, target, message, timeout, future):
+        self.target = target
+        self.message = message
+        self.timeout = timeout
+        self.future = future
+
+
+class _Asker(AsyncActor):
+    @behavior(_Ask)
+    async def _ask(self, message):
+        try:
+            result = await message.target.ask(message.message, timeout=message.timeout)
+        except Exception as e:
+            message.future.set_exception(e)
+        else:
+            message.future.set_result(result)
+
+
+class _ProbeActor(AsyncActor):
+    lightweight = True
+
+    def before_start(self, envelopes):
+        self.envelopes = envelopes
+
+    @behavior(object)
+    def _record(self, message):
+        self.envelopes.append(self.context.envelope)
+
+
+class Probe(object):
+    """ An actor that records every message it receives. """
+
+    def __init__(self):
+        self.envelopes = []
+        self.ref = spawn(_ProbeActor, self.envelopes)
+
+    @property
+    def messages(self):
+        return [envelope.message for envelope in self.envelopes]
+
+    def expect(self, msg_type=object):
+        """Removes and returns the first received message of `msg_type`."""
+        for (i, envelope) in enumerate(self.envelopes):
+            if isinstance(envelope.message, msg_type):
+                del self.envelopes[i]
+                return envelope.message
+        raise AssertionError('{} has not been received; got {}'.format(
+            msg_type.__name__, self.messages))
+
+
+class TestRuntime(object):
+    """ Runs actors deterministically on a single `VirtualTimeLoop`.
+
+    While started, `spawn` and every other cluster function use a fresh
+    cluster with no threads; nothing runs until the runtime is driven with
+    `run_until_idle`, `advance`, `run_until_complete` or `ask`.
+
+        with TestRuntime(seed=3) as runtime:
+            bot = spawn(BotActor)
+            assert runtime.ask(bot, 'hello') == 'hi'
+            runtime.advance(60)
+    """
+
+    __test__ = False  # not a test case, despite its name
+
+    def __init__(self, seed=None):
+        self.loop = VirtualTimeLoop(seed)
+        self._saved = None
+        self._asker = None
+
+    def start(self):
+        self._saved = ActorCluster.instance
+        ActorCluster.instance = None
+        ActorCluster.instance = ActorCluster(ActorRegistry(), loops=[self.loop])
+        return self
+
+    def stop(self):
+        # Actors still waiting for messages are not left pending on a closed loop.
+        for task in all_tasks(self.loop):
+            task.cancel()
+        self.loop.run_until_idle()
+        ActorCluster.instance = self._saved
+        self._saved = None
+        self.loop.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def time(self):
+        return self.loop.time()
+
+    def step(self):
+        return self.loop.step()
+
+    def run_until_idle(self):
+        self.loop.run_until_idle()
+
+    def advance(self, seconds):
+        self.loop.advance(seconds)
+
+    def run_until_complete(self, awaitable):
+        if isinstance(awaitable, Future):
+            # E.g. the completion of a flow run from the test itself.
+            awaitable = wrap_future(awaitable, loop=self.loop)
+        return self.loop.run_until_complete(awaitable)
+
+    def ask(self, ref, message, timeout=None):
+        """Asks `ref` from outside any actor, advancing time until the reply
+        or the timeout."""
+        if self._asker is None:
+            self._asker = spawn(_Asker)
+        future = self.loop.create_future()
+        self._asker.tell(_Ask(ref, message, timeout, future))
+        return self.loop.run_until_complete(future)
+
+    def probe(self):
+        return Probe()
+
+    @staticmethod
+    def pending(ref):
+        """Messages queued in a local actor's mailbox, oldest first."""
+        return [envelope.message for envelope in ref._mailbox.peek()]
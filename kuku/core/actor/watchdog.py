@@ -0,0 +1,270 @@
+from collections import Counter, deque
+import cProfile
+import io
+import pstats
+import sys
+from threading import Event, get_ident, Lock, Thread
+import time
+import traceback
+import types
+
+from .base import logger
+
+__all__ = (
+    'LoopWatchdog',
+    'Stall',
+    'enable_profiling',
+    'disable_profiling',
+)
+
+
+class Stall(object):
+    __slots__ = ('actor_type', 'message_type', 'started', 'duration', 'stack')
+
+    def __init__(self, actor_type, message_type, started, stack):
+        self.actor_type = actor_type
+        self.message_type = message_type
+        self.started = started
+        self.duration = None  # set once the loop responds again
+        self.stack = stack
+
+    def __repr__(self):
+        return 'Stall({}, {}, {})'.format(
+            getattr(self.actor_type, '__name__', None),
+            getattr(self.message_type, '__name__', None),
+            self.duration)
+
+
+def find_behavior_frame(frame):
+    """Returns (actor type, message type) of the innermost behavior running
+    in `frame`'s stack, or (None, None)."""
+    while frame is not None:
+        obj = frame.f_locals.get('self')
+        behaviors = getattr(type(obj), 'behaviors', None)
+        if isinstance(behaviors, dict) and frame.f_code.co_argcount > 1:
+            for behav in behaviors.values():
+                if getattr(behav, '__code__', None) is frame.f_code:
+                    message = frame.f_locals.get(frame.f_code.co_varnames[1])
+                    return type(obj), type(message)
+        frame = frame.f_back
+    return None, None
+
+
+class LoopWatchdog(object):
+    """ Detects when a loop is blocked for longer than `threshold` seconds.
+
+    The watchdog thread posts a heartbeat to the loop and waits for it to run.
+    If it does not run in time, the loop thread's stack is captured, labeled
+    with the behavior found in it, logged and kept in `stalls`.
+    """
+
+    def __init__(self, loop, thread_id, threshold, on_stall=None):
+        self.loop = loop
+        self.thread_id = thread_id
+        self.threshold = threshold
+        self.on_stall = on_stall
+        self.stalls = deque(maxlen=100)
+        self._answered = Event()
+        self._stopped = Event()
+        self._thread = Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def _capture(self, started):
+        frame = sys._current_frames().get(self.thread_id)
+        actor_type, message_type = find_behavior_frame(frame)
+        stack = traceback.format_stack(frame) if frame is not None else []
+        return Stall(actor_type, message_type, started, stack)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._answered.clear()
+            started = time.monotonic()
+            self.loop.call_soon_threadsafe(self._answered.set)
+            if not self._answered.wait(self.threshold):
+                stall = self._capture(started)
+                self.stalls.append(stall)
+                logger.warning('Loop blocked for over {}s in {} handling {}:\n{}'.format(
+                    self.threshold,
+                    getattr(stall.actor_type, '__name__', 'unknown actor'),
+                    getattr(stall.message_type, '__name__', 'unknown message'),
+                    ''.join(stall.stack)))
+                while not self._answered.wait(self.threshold):
+                    if self._stopped.is_set():
+                        return
+                stall.duration = time.monotonic() - started
+                logger.warning('Loop unblocked after {:.3f}s'.format(stall.duration))
+                if self.on_stall is not None:
+                    self.on_stall(stall)
+            self._stopped.wait(self.threshold / 2)
+
+
+class BehaviorProfiler(object):
+    """ Runs behaviors of one actor type under cProfile.
+
+    Profiles are kept per thread, since cluster loops run concurrently, and
+    merged by `report()`. Coroutine behaviors are profiled step by step, not
+    while they wait. Wall time per message type is kept in `timings`.
+    """
+
+    def __init__(self, actor_type):
+        self.actor_type = actor_type
+        self.timings = {}  # message type -> [calls, total seconds]
+        self._profiles = {}
+        self._lock = Lock()
+        self._fallback = None  # SamplingProfiler, once cProfile is unavailable
+
+    def _start(self):
+        if self._fallback is not None:
+            return self._fallback._start()
+        thread_id = get_ident()
+        profile = self._profiles.get(thread_id)
+        if profile is None:
+            with self._lock:
+                profile = self._profiles[thread_id] = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            # Another profiler is active; Python 3.12+ allows only one.
+            self._fall_back(thread_id, e)
+            return self._fallback._start()
+        return profile
+
+    def _stop(self, token):
+        if isinstance(token, cProfile.Profile):
+            token.disable()
+        else:
+            self._fallback._stop(token)
+
+    def _fall_back(self, thread_id, error):
+        with self._lock:
+            self._profiles.pop(thread_id, None)
+            if self._fallback is None:
+                logger.warning('Cannot profile {} with cProfile ({}); sampling instead'.format(
+                    self.actor_type.__name__, error))
+                self._fallback = SamplingProfiler(self.actor_type)
+
+    def record(self, message_type, elapsed):
+        with self._lock:
+            timing = self.timings.get(message_type)
+            if timing is None:
+                timing = self.timings[message_type] = [0, 0.0]
+            timing[0] += 1
+            timing[1] += elapsed
+
+    def call(self, message_type, fn, *args, **kwargs):
+        token = self._start()
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._stop(token)
+            self.record(message_type, elapsed)
+
+    @types.coroutine
+    def steps(self, coro):
+        """Awaits `coro`, profiling each of its steps on its own."""
+        value, error = None, None
+        while True:
+            token = self._start()
+            try:
+                if error is None:
+                    awaited = coro.send(value)
+                else:
+                    awaited = coro.throw(error)
+            except StopIteration as e:
+                return e.value
+            finally:
+                self._stop(token)
+            try:
+                value, error = (yield awaited), None
+            except BaseException as e:
+                value, error = None, e
+
+    def report(self, limit=30):
+        out = io.StringIO()
+        with self._lock:
+            profiles = list(self._profiles.values())
+        if profiles:
+            stats = pstats.Stats(profiles[0], stream=out)
+            for profile in profiles[1:]:
+                stats.add(profile)
+            stats.sort_stats('cumulative').print_stats(limit)
+        if self._fallback is not None:
+            out.write(self._fallback.report())
+        return out.getvalue()
+
+    def stop(self):
+        if self._fallback is not None:
+            self._fallback.stop()
+
+
+class SamplingProfiler(BehaviorProfiler):
+    """ Samples the stacks of threads running behaviors of one actor type
+    every `interval` seconds; cheaper than cProfile for hot behaviors. """
+
+    def __init__(self, actor_type, interval=0.005):
+        super().__init__(actor_type)
+        self.interval = interval
+        self.samples = Counter()
+        self._active = {}  # thread id -> nesting depth
+        self._stopped = Event()
+        Thread(target=self._sample, daemon=True).start()
+
+    def _start(self):
+        thread_id = get_ident()
+        self._active[thread_id] = self._active.get(thread_id, 0) + 1
+        return thread_id
+
+    def _stop(self, thread_id):
+        depth = self._active.pop(thread_id) - 1
+        if depth:
+            self._active[thread_id] = depth
+
+    def _sample(self):
+        while not self._stopped.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in list(self._active):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self.samples[tuple(
+                        '{}:{} {}'.format(f.filename, f.lineno, f.name)
+                        for f in traceback.extract_stack(frame))] += 1
+
+    def stop(self):
+        self._stopped.set()
+
+    def report(self, limit=10):
+        lines = []
+        for stack, count in self.samples.most_common(limit):
+            lines.append('{} samples:'.format(count))
+            lines.extend('    ' + entry for entry in stack)
+        return '\n'.join(lines)
+
+
+def enable_profiling(actor_type, sampling=False, interval=0.005):
+    """Profiles the behaviors of `actor_type` (and its subclasses) from now
+    on, with cProfile or, if `sampling`, with a stack sampler. cProfile
+    falls back to sampling when another profiler is already active."""
+    if sampling:
+        profiler = SamplingProfiler(actor_type, interval)
+    else:
+        profiler = BehaviorProfiler(actor_type)
+    actor_type._profiler = profiler
+    return profiler
+
+
+def disable_profiling(actor_type):
+    """Stops profiling `actor_type`; returns its profiler for `report()`."""
+    profiler = actor_type.__dict__.get('_profiler')
+    if profiler is None:
+        return None
+    del actor_type._profiler
+    profiler.stop()
+    return profiler
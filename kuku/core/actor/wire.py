@@ -0,0 +1,76 @@
+import pickle
+import struct
+from threading import Lock
+
+__all__ = (
+    'Channel',
+    'FrameReader',
+    'pack_frame',
+)
+
+
+# Frame opcodes. Every frame is a tuple whose first item is an opcode.
+OP_SPAWN = 1
+OP_ENVELOPE = 2
+OP_HELLO = 3
+OP_REGISTER = 4
+OP_UNREGISTER = 5
+
+_HEADER = struct.Struct('!I')
+
+
+def encode_envelope(target_id, envelope, sender_id):
+    return (OP_ENVELOPE, target_id, sender_id,
+            envelope.req_token, envelope.resp_token, envelope.message)
+
+
+class Channel(object):
+    """ Thread-safe framed channel over a multiprocessing Connection
+
+    Frames are pickled with the highest protocol and sent as one
+    length-prefixed message each, whatever their size; copying a large
+    payload through shared memory would cost more copies and syscalls than
+    the pipe does.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._send_lock = Lock()
+
+    def send(self, frame):
+        data = pickle.dumps(frame, pickle.HIGHEST_PROTOCOL)
+        with self._send_lock:
+            self._conn.send_bytes(data)
+
+    def recv(self):
+        return pickle.loads(self._conn.recv_bytes())
+
+    def close(self):
+        self._conn.close()
+
+
+def pack_frame(frame):
+    """Pickles `frame` into a length-prefixed chunk for a byte stream."""
+    data = pickle.dumps(frame, pickle.HIGHEST_PROTOCOL)
+    return _HEADER.pack(len(data)) + data
+
+
+class FrameReader(object):
+    """ Splits a byte stream of `pack_frame` chunks back into frames """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        self._buffer += data
+        frames = []
+        offset = 0
+        while len(self._buffer) - offset >= _HEADER.size:
+            size, = _HEADER.unpack_from(self._buffer, offset)
+            end = offset + _HEADER.size + size
+            if end > len(self._buffer):
+                break
+            frames.append(pickle.loads(self._buffer[offset + _HEADER.size:end]))
+            offset = end
+        del self._buffer[:offset]
+        return frames
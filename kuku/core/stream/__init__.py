@@ -0,0 +1,9 @@
+from .message import *
+from .stage import *
+from .flow import *
+
+__all__ = (
+    message.__all__ +
+    stage.__all__ +
+    flow.__all__
+)
@@ -0,0 +1,126 @@
+from asyncio import get_running_loop
+from concurrent.futures import Future
+
+from ..actor import spawn
+from .stage import (
+    AsyncMapStage,
+    BufferStage,
+    FilterStage,
+    GroupWithinStage,
+    IterableSource,
+    MapStage,
+    ParallelMapStage,
+    QueueSource,
+    SinkStage,
+    ThrottleStage
+)
+
+__all__ = (
+    'Source',
+    'Sink',
+    'RunningFlow',
+)
+
+
+class Source(object):
+    """An immutable description of a stream up to, but excluding, its sink.
+
+    Nothing runs until `run_with()` spawns one stage actor per step.
+    """
+    __slots__ = ('_stages', )
+
+    def __init__(self, stages):
+        self._stages = tuple(stages)
+
+    @staticmethod
+    def from_iterable(iterable):
+        return Source([(IterableSource, {'iterable': iterable})])
+
+    @staticmethod
+    def queue(size=64):
+        """A source fed by asking it `Offer(element)` and ended by telling it
+        `Complete()`; its ref is `RunningFlow.source`."""
+        return Source([(QueueSource, {'window': size})])
+
+    def via(self, stage_type, **options):
+        return Source(self._stages + ((stage_type, options), ))
+
+    def map(self, fn):
+        return self.via(MapStage, fn=fn)
+
+    def filter(self, predicate):
+        return self.via(FilterStage, predicate=predicate)
+
+    def map_async(self, fn, parallelism=1):
+        return self.via(AsyncMapStage, fn=fn, parallelism=parallelism)
+
+    def parallel_map(self, fn, parallelism=4, executor=None):
+        return self.via(ParallelMapStage, fn=fn, parallelism=parallelism, executor=executor)
+
+    def buffer(self, size):
+        return self.via(BufferStage, size=size)
+
+    def throttle(self, elements, per):
+        return self.via(ThrottleStage, elements=elements, per=per)
+
+    def group_within(self, size, within):
+        return self.via(GroupWithinStage, size=size, within=within)
+
+    def run_with(self, sink, *, parent=None):
+        """Spawns the stages and `sink`. The `completion` of the returned flow
+        is a future of the calling thread's running loop, or a
+        `concurrent.futures.Future` when called outside of any loop."""
+        try:
+            completion = get_running_loop().create_future()
+        except RuntimeError:
+            completion = Future()
+        options = {} if parent is None else {'parent': parent}
+
+        upstream = None
+        refs = []
+        for (stage_type, stage_options) in self._stages:
+            upstream = spawn(stage_type, upstream=upstream, **dict(stage_options, **options))
+            refs.append(upstream)
+        sink_type, sink_options = sink
+        refs.append(spawn(sink_type, upstream=upstream, completion=completion,
+                          **dict(sink_options, **options)))
+        return RunningFlow(refs, completion)
+
+    def run_foreach(self, fn, **kwargs):
+        return self.run_with(Sink.foreach(fn), **kwargs)
+
+    def run_collect(self, **kwargs):
+        return self.run_with(Sink.collect(), **kwargs)
+
+
+class Sink(object):
+    @staticmethod
+    def fold(initial, fn, window=None):
+        return (SinkStage, {'fn': fn, 'initial': initial, 'window': window})
+
+    @staticmethod
+    def foreach(fn, window=None):
+        return Sink.fold(None, lambda _, item: fn(item), window)
+
+    @staticmethod
+    def collect(window=None):
+        def append(items, item):
+            items.append(item)
+            return items
+        return (SinkStage, {'fn': append, 'initial': [], 'window': window})
+
+
+class RunningFlow(object):
+    __slots__ = ('stages', 'completion')
+
+    def __init__(self, stages, completion):
+        self.stages = stages
+        self.completion = completion
+
+    @property
+    def source(self):
+        return self.stages[0]
+
+    @property
+    def sink(self):
+        return self.stages[-1]
@@ -0,0 +1,51 @@
+__all__ = (
+    'Demand',
+    'Chunk',
+    'Complete',
+    'Failure',
+    'Cancel',
+    'Offer',
+)
+
+
+class Demand(object):
+    """Sent upstream: the sender can take `count` more elements."""
+    __slots__ = ('count', )
+
+    def __init__(self, count):
+        self.count = count
+
+
+class Chunk(object):
+    """Sent downstream: never more elements than were demanded."""
+    __slots__ = ('items', )
+
+    def __init__(self, items):
+        self.items = items
+
+
+class Complete(object):
+    """Sent downstream once upstream has no more elements."""
+    __slots__ = ()
+
+
+class Failure(object):
+    """Sent downstream when a stage fails; the stream stops."""
+    __slots__ = ('error', )
+
+    def __init__(self, error):
+        self.error = error
+
+
+class Cancel(object):
+    """Sent upstream when downstream stops early."""
+    __slots__ = ()
+
+
+class Offer(object):
+    """Asked to a queue source; replied to once the element is accepted."""
+    __slots__ = ('item', )
+
+    def __init__(self, item):
+        self.item = item
+
@@ -0,0 +1,459 @@
+from asyncio import iscoroutine
+from collections import deque
+from concurrent.futures import Future
+
+from ..actor import ActorLifeCycle, AsyncActor, behavior
+from ..actor.context import _settle
+from .message import Cancel, Chunk, Complete, Demand, Failure, Offer
+
+__all__ = (
+    'Stage',
+    'IterableSource',
+    'QueueSource',
+    'MapStage',
+    'FilterStage',
+    'AsyncMapStage',
+    'ParallelMapStage',
+    'BufferStage',
+    'ThrottleStage',
+    'GroupWithinStage',
+    'SinkStage',
+)
+
+
+class _Resume(object):
+    """Sent by a stage to itself when pending work may have finished."""
+    __slots__ = ('generation', )
+
+    def __init__(self, generation=None):
+        self.generation = generation
+
+
+class Stage(AsyncActor):
+    """An actor hosting one step of a stream.
+
+    Elements only move downstream in answer to `Demand`, and a stage never
+    holds more than `window` elements (buffered, requested or in flight), so
+    a slow consumer bounds the memory of the whole pipeline. Elements travel
+    as `Chunk`s of up to the demanded count, one envelope per chunk.
+    """
+
+    window = 64
+
+    def before_start(self, upstream=None, window=None, **options):
+        self.upstream = upstream
+        self.downstream = None
+        if window is not None:
+            self.window = window
+        self.buffer = deque()
+        self.demand = 0
+        self.requested = 0
+        self.upstream_done = False
+        self.configure(**options)
+
+    def configure(self):
+        pass
+
+    # Hooks for subclasses.
+
+    def push(self, items):
+        """Takes elements from upstream; ready output goes to `self.buffer`."""
+        self.buffer.extend(items)
+
+    def pending(self):
+        """Number of elements taken but not yet ready for output."""
+        return 0
+
+    def on_upstream_complete(self):
+        pass
+
+    # Flow control.
+
+    def pull(self):
+        if self.upstream is None or self.upstream_done:
+            return
+        room = self.window - len(self.buffer) - self.pending() - self.requested
+        # Ask for elements in batches rather than one by one.
+        if room > 0 and (self.requested == 0 or room * 2 >= self.window):
+            self.requested += room
+            self.upstream.tell(Demand(room), sender=self.context.ref)
+
+    def emit(self):
+        if self.downstream is None:
+            return
+        count = min(self.demand, len(self.buffer))
+        if count:
+            items = [self.buffer.popleft() for _ in range(count)]
+            self.demand -= count
+            self.downstream.tell(Chunk(items), sender=self.context.ref)
+        if self.upstream_done and not self.buffer and not self.pending():
+            self.downstream.tell(Complete(), sender=self.context.ref)
+            self.stop()
+
+    def abort(self, error):
+        if self.downstream is not None:
+            self.downstream.tell(Failure(error), sender=self.context.ref)
+        if self.upstream is not None and not self.upstream_done:
+            self.upstream.tell(Cancel(), sender=self.context.ref)
+        self.stop()
+
+    def stop(self):
+        self.life_cycle = ActorLifeCycle.stopped
+
+    def _guarded(self, step, *args):
+        # Errors in user functions end the stream instead of restarting the stage.
+        try:
+            step(*args)
+        except Exception as e:
+            self.abort(e)
+            return False
+        return True
+
+    @behavior(Demand)
+    def _on_demand(self, message):
+        self.downstream = self.sender
+        self.demand += message.count
+        self.emit()
+        self.pull()
+
+    @behavior(Chunk)
+    def _on_chunk(self, message):
+        self.requested -= len(message.items)
+        if self._guarded(self.push, message.items):
+            self.emit()
+            self.pull()
+
+    @behavior(Complete)
+    def _on_complete(self, message):
+        self.upstream_done = True
+        if self._guarded(self.on_upstream_complete):
+            self.emit()
+
+    @behavior(Failure)
+    def _on_failure(self, message):
+        self.upstream_done = True
+        self.abort(message.error)
+
+    @behavior(Cancel)
+    def _on_cancel(self, message):
+        self.downstream = None
+        if self.upstream is not None and not self.upstream_done:
+            self.upstream.tell(Cancel(), sender=self.context.ref)
+        self.stop()
+
+    def _answer(self, envelope, message):
+        # Replies to an earlier ask from within another behavior.
+        current = self.context.envelope
+        with self.context.msg_scope(envelope):
+            envelope.sender.reply(message)
+        self.context.envelope = current
+
+
+class IterableSource(Stage):
+    """Emits the elements of an iterable, pulling it only as demanded."""
+
+    def configure(self, iterable):
+        self.iterator = iter(iterable)
+
+    def emit(self):
+        if not self.upstream_done and len(self.buffer) < self.demand:
+            want = self.demand - len(self.buffer)
+            for item in self.iterator:
+                self.buffer.append(item)
+                want -= 1
+                if want == 0:
+                    break
+            else:
+                self.upstream_done = True
+        super().emit()
+
+    @behavior(Demand)
+    def _on_demand(self, message):
+        self.downstream = self.sender
+        self.demand += message.count
+        self._guarded(self.emit)
+
+
+class QueueSource(Stage):
+    """Emits elements offered by other actors.
+
+    `Offer` is answered once the element fits in the buffer, so producers
+    that await their asks are slowed down to the pace of the stream.
+    `Complete` ends the stream after the buffered elements.
+    """
+
+    def configure(self):
+        self.offers = deque()
+
+    def _admit(self):
+        while self.offers and len(self.buffer) < self.window:
+            envelope = self.offers.popleft()
+            self.buffer.append(envelope.message.item)
+            self._answer(envelope, True)
+
+    @behavior(Offer)
+    def _on_offer(self, message):
+        if self.upstream_done:
+            self.sender.reply(False)
+            return
+        self.offers.append(self.context.envelope)
+        self._admit()
+        self.emit()
+
+    @behavior(Demand)
+    def _on_demand(self, message):
+        self.downstream = self.sender
+        self.demand += message.count
+        self.emit()
+        self._admit()
+        self.emit()
+
+    @behavior(Complete)
+    def _on_complete(self, message):
+        self.upstream_done = True
+        self.emit()
+
+    def stop(self):
+        for envelope in self.offers:
+            self._answer(envelope, False)
+        self.offers.clear()
+        super().stop()
+
+
+class MapStage(Stage):
+    def configure(self, fn):
+        self.fn = fn
+
+    def push(self, items):
+        self.buffer.extend(map(self.fn, items))
+
+
+class FilterStage(Stage):
+    def configure(self, predicate):
+        self.predicate = predicate
+
+    def push(self, items):
+        self.buffer.extend(filter(self.predicate, items))
+
+
+class AsyncMapStage(Stage):
+    """Maps elements through a function returning an awaitable, with up to
+    `parallelism` calls in flight. Output keeps the input order.
+
+    The function runs inside this actor's context, so it may `ask` other
+    actors.
+    """
+
+    def configure(self, fn, parallelism=1):
+        self.fn = fn
+        self.parallelism = parallelism
+        self.waiting = deque()
+        self.running = deque()
+
+    def pending(self):
+        return len(self.waiting) + len(self.running)
+
+    def start(self, item):
+        result = self.fn(item)
+        if iscoroutine(result):
+            result = self.context.run_main(result)
+        return result
+
+    def _on_done(self, fut):
+        if self.life_cycle not in (ActorLifeCycle.stopped, ActorLifeCycle.dead):
+            self.context.ref.tell(_Resume(), sender=self.context.ref)
+
+    def _launch(self):
+        while self.waiting and len(self.running) < self.parallelism:
+            fut = self.start(self.waiting.popleft())
+            fut.add_done_callback(self._on_done)
+            self.running.append(fut)
+
+    def _collect(self):
+        while self.running and self.running[0].done():
+            self.buffer.append(self.running.popleft().result())
+
+    def push(self, items):
+        self.waiting.extend(items)
+        self._launch()
+
+    @behavior(_Resume)
+    def _on_resume(self, message):
+        if self._guarded(self._collect) and self._guarded(self._launch):
+            self.emit()
+            self.pull()
+
+    def stop(self):
+        for fut in self.running:
+            fut.cancel()
+        self.running.clear()
+        self.waiting.clear()
+        super().stop()
+
+
+class ParallelMapStage(AsyncMapStage):
+    """Maps elements through a blocking function on `executor` (the loop's
+    default executor when None), with up to `parallelism` calls at once."""
+
+    def configure(self, fn, parallelism=4, executor=None):
+        super().configure(fn, parallelism)
+        self.executor = executor
+
+    def start(self, item):
+        return self.context.loop.run_in_executor(self.executor, self.fn, item)
+
+
+class BufferStage(Stage):
+    """Decouples upstream from downstream by up to `size` elements."""
+
+    def configure(self, size):
+        self.window = size
+
+
+class ThrottleStage(Stage):
+    """Emits at most `elements` per `per` seconds, allowing bursts of up to
+    `elements`."""
+
+    def configure(self, elements, per):
+        self.capacity = elements
+        self.rate = elements / per
+        self.tokens = float(elements)
+        self.last_refill = self.context.loop.time()
+        self.wakeup = None
+
+    def _refill(self):
+        now = self.context.loop.time()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def emit(self):
+        if self.downstream is None:
+            return
+        self._refill()
+        count = min(self.demand, len(self.buffer), int(self.tokens))
+        if count:
+            items = [self.buffer.popleft() for _ in range(count)]
+            self.demand -= count
+            self.tokens -= count
+            self.downstream.tell(Chunk(items), sender=self.context.ref)
+        if self.buffer and self.demand:
+            if self.wakeup is None:
+                delay = (1 - self.tokens) / self.rate
+                self.wakeup = self.context.schedule_once(delay, _Resume())
+        elif self.upstream_done and not self.buffer:
+            self.downstream.tell(Complete(), sender=self.context.ref)
+            self.stop()
+
+    @behavior(_Resume)
+    def _on_resume(self, message):
+        self.wakeup = None
+        self.emit()
+        self.pull()
+
+
+class GroupWithinStage(Stage):
+    """Emits lists of up to `size` elements, or fewer once `within` seconds
+    have passed since the first element of the group arrived."""
+
+    def configure(self, size, within):
+        self.size = size
+        self.within = within
+        self.group = []
+        self.generation = 0
+        self.timer = None
+
+    def pending(self):
+        return len(self.group)
+
+    def _close_group(self):
+        self.buffer.append(self.group)
+        self.group = []
+        self.generation += 1
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    def push(self, items):
+        for item in items:
+            self.group.append(item)
+            if len(self.group) == 1:
+                self.timer = self.context.schedule_once(
+                    self.within, _Resume(self.generation))
+            if len(self.group) >= self.size:
+                self._close_group()
+
+    def pull(self):
+        # The window counts input elements; whole groups wait in the buffer.
+        if self.upstream is None or self.upstream_done:
+            return
+        room = self.window - len(self.buffer) * self.size - len(self.group) - self.requested
+        if room > 0 and (self.requested == 0 or room * 2 >= self.window):
+            self.requested += room
+            self.upstream.tell(Demand(room), sender=self.context.ref)
+
+    def on_upstream_complete(self):
+        if self.group:
+            self._close_group()
+
+    @behavior(_Resume)
+    def _on_resume(self, message):
+        if message.generation == self.generation and self.group:
+            self.timer = None
+            self._close_group()
+            self.emit()
+            self.pull()
+
+
+class SinkStage(Stage):
+    """The end of a stream, which drives it by sending the first `Demand`.
+
+    Each element is folded into the result with `fn(result, element)`. The
+    `completion` future gets the result once the stream completes, or the
+    error if it fails.
+    """
+
+    def configure(self, fn, initial=None, completion=None):
+        self.fn = fn
+        self.result = initial
+        self.completion = completion
+        self.pull()
+
+    def push(self, items):
+        fn = self.fn
+        result = self.result
+        for item in items:
+            result = fn(result, item)
+        self.result = result
+
+    def _finish(self, result=None, exception=None):
+        self.upstream_done = True
+        fut = self.completion
+        if isinstance(fut, Future):
+            if fut.set_running_or_notify_cancel():
+                _settle(fut, result, exception)
+        elif fut is not None:
+            loop = fut.get_loop()
+            if loop is self.context.loop:
+                _settle(fut, result, exception)
+            else:
+                loop.call_soon_threadsafe(_settle, fut, result, exception)
+        self.stop()
+
+    @behavior(Chunk)
+    def _on_chunk(self, message):
+        self.requested -= len(message.items)
+        try:
+            self.push(message.items)
+        except Exception as e:
+            self.upstream.tell(Cancel(), sender=self.context.ref)
+            self._finish(exception=e)
+            return
+        self.pull()
+
+    @behavior(Complete)
+    def _on_complete(self, message):
+        self._finish(self.result)
+
+    @behavior(Failure)
+    def _on_failure(self, message):
+        self._finish(exception=message.error)
@@ -13,7 +13,7 @@ def _run_event_loop_forever(loop):
 
 
 _main_loop = get_event_loop()
-_main_loop_thread = Thread(target=_run_event_loop_forever, args=[_main_loop])
+_main_loop_thread = Thread(target=_run_event_loop_forever, args=[_main_loop], daemon=True)
 _main_loop_thread.start()
 
 
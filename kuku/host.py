@@ -0,0 +1,320 @@
+import hashlib
+import multiprocessing
+import queue
+import threading
+import time
+
+__all__ = [
+    'WorkspaceHost',
+    'workspace_id'
+]
+
+
+def workspace_id(token):
+    """A short name for a workspace that does not reveal its token."""
+    return hashlib.sha1(token.encode()).hexdigest()[:12]
+
+
+# Longest wait between two restarts of a workspace whose client keeps dying.
+MAX_RESTART_DELAY = 300
+
+
+def workspace_worker(index, bots, bot_username, state_dir, check_interval, restart_limit,
+                     commands, results):
+    """Main function of a worker process hosting a shard of workspaces.
+
+    Every workspace gets its own SlackClientActor, and so its own router and
+    BotRegistry. A workspace whose client died is restarted on the next check,
+    and if it keeps dying, after a delay doubling up to MAX_RESTART_DELAY; it
+    is given up on once `restart_limit` restarts in a row have failed.
+    """
+    from kuku import configure, SlackClientActor, SlackMessageRouterActor
+
+    clients = {}
+    started = {}   # token -> time its client was last started
+    restarts = {}  # token -> restarts so far
+    failures = {}  # token -> failures since its client last ran for a while
+    retry_at = {}  # token -> time of its next restart
+
+    def start(token):
+        started[token] = time.time()
+        clients[token] = SlackClientActor.start(
+            token=token,
+            router=configure(SlackMessageRouterActor, bots=bots),
+            bot_username=bot_username,
+            state_dir=state_dir
+        )
+
+    def stop(token):
+        client_ref = clients.pop(token, None)
+        for state in (started, restarts, failures, retry_at):
+            state.pop(token, None)
+        if client_ref is not None and client_ref.is_alive():
+            client_ref.stop()
+
+    def check(token, client_ref):
+        now = time.time()
+        if client_ref.is_alive():
+            if now - started[token] > MAX_RESTART_DELAY:
+                failures.pop(token, None)
+            return
+        if failures.get(token, 0) > restart_limit:
+            return
+        if token not in retry_at:
+            failures[token] = failures.get(token, 0) + 1
+            if failures[token] > restart_limit:
+                print('Giving up on workspace {} on worker {} after {} restarts'.format(
+                    workspace_id(token), index, restart_limit))
+                return
+            # The first restart is immediate, the next ones back off.
+            delay = 0 if failures[token] == 1 else check_interval * 2 ** (failures[token] - 2)
+            retry_at[token] = now + min(delay, MAX_RESTART_DELAY)
+        if now >= retry_at[token]:
+            del retry_at[token]
+            print('Restarting workspace {} on worker {}'.format(workspace_id(token), index))
+            restarts[token] = restarts.get(token, 0) + 1
+            start(token)
+
+    def report():
+        workspaces = {}
+        for token, client_ref in clients.items():
+            stats = None
+            if client_ref.is_alive():
+                try:
+                    stats = client_ref.ask({'type': 'stats'}, timeout=5)
+                except Exception:
+                    pass
+            workspaces[token] = {
+                'alive': stats is not None,
+                'restarts': restarts.get(token, 0),
+                'given_up': failures.get(token, 0) > restart_limit,
+                'stats': stats or {},
+            }
+        return workspaces
+
+    while True:
+        try:
+            command = commands.get(timeout=check_interval)
+        except queue.Empty:
+            command = ('check', )
+
+        if command[0] == 'start':
+            start(command[1])
+        elif command[0] == 'stop':
+            stop(command[1])
+        elif command[0] == 'report':
+            results.put(('report', command[1], index, report()))
+        elif command[0] == 'check':
+            for token, client_ref in list(clients.items()):
+                check(token, client_ref)
+        elif command[0] == 'shutdown':
+            for token in list(clients):
+                stop(token)
+            return
+
+
+class _Worker(object):
+    def __init__(self, index, context, args):
+        self.index = index
+        self.context = context
+        self.args = args
+        self.tokens = set()
+        self.restarts = 0
+        self.commands = None
+        self.process = None
+
+    def spawn(self, results):
+        self.commands = self.context.Queue()
+        self.process = self.context.Process(
+            target=workspace_worker,
+            args=(self.index, ) + self.args + (self.commands, results),
+            daemon=True)
+        self.process.start()
+        for token in self.tokens:
+            self.commands.put(('start', token))
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+
+class WorkspaceHost(object):
+    """Hosts many Slack workspaces, sharded across worker processes.
+
+    Workspaces go to the worker hosting the fewest of them, and when removals
+    leave the shards uneven by more than one workspace, workspaces are moved
+    from the fullest worker to the emptiest one. A worker process that dies is
+    respawned with its shard, and a workspace whose client keeps dying is
+    restarted with backoff, up to `restart_limit` times in a row (see
+    `workspace_worker`). `health()` and `metrics()` aggregate the reports
+    of all workers. With `state_dir`, every workspace checkpoints to its own
+    log there, so its sessions survive restarts and moves between workers; a
+    moved workspace's new client waits for the old one to close that log.
+
+    Workspaces are sharded across processes only: Slack clients and routers
+    run on pykka threads, and the bots of a process share its one event loop
+    (see `kuku.event_loop`), so there is no number of loops per worker.
+    """
+
+    def __init__(self, bots, bot_username='kuku', worker_count=None, check_interval=10,
+                 state_dir=None, restart_limit=10):
+        self._context = multiprocessing.get_context('spawn')
+        self._results = self._context.Queue()
+        self._workers = [
+            _Worker(i, self._context,
+                    (bots, bot_username, state_dir, check_interval, restart_limit))
+            for i in range(worker_count or multiprocessing.cpu_count())
+        ]
+        self._check_interval = check_interval
+        self._lock = threading.RLock()
+        self._reports_lock = threading.Lock()  # one collection of reports at a time
+        self._report_ids = iter(range(1, 2 ** 63))
+        self._monitor = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        with self._lock:
+            for worker in self._workers:
+                worker.spawn(self._results)
+        self._monitor = threading.Thread(target=self._monitor_workers, daemon=True)
+        self._monitor.start()
+
+    def stop(self):
+        self._stopped.set()
+        with self._lock:
+            for worker in self._workers:
+                if worker.is_alive():
+                    worker.commands.put(('shutdown', ))
+            for worker in self._workers:
+                if worker.process is not None:
+                    worker.process.join(self._check_interval)
+                    if worker.process.is_alive():
+                        worker.process.terminate()
+
+    def _monitor_workers(self):
+        while not self._stopped.wait(self._check_interval):
+            with self._lock:
+                if self._stopped.is_set():
+                    return
+                for worker in self._workers:
+                    if worker.process is not None and not worker.is_alive():
+                        print('Respawning worker {} with {} workspaces'.format(
+                            worker.index, len(worker.tokens)))
+                        worker.restarts += 1
+                        worker.spawn(self._results)
+
+    @property
+    def workspaces(self):
+        with self._lock:
+            return {token: worker.index for worker in self._workers for token in worker.tokens}
+
+    def _worker_of(self, token):
+        for worker in self._workers:
+            if token in worker.tokens:
+                return worker
+        return None
+
+    def _assign(self, worker, token):
+        worker.tokens.add(token)
+        if worker.commands is not None:
+            worker.commands.put(('start', token))
+
+    def _unassign(self, worker, token):
+        worker.tokens.discard(token)
+        if worker.commands is not None:
+            worker.commands.put(('stop', token))
+
+    def add_workspace(self, token):
+        with self._lock:
+            if self._worker_of(token) is not None:
+                return
+            worker = min(self._workers, key=lambda w: len(w.tokens))
+            self._assign(worker, token)
+
+    def remove_workspace(self, token):
+        with self._lock:
+            worker = self._worker_of(token)
+            if worker is None:
+                return
+            self._unassign(worker, token)
+            self.rebalance()
+
+    def set_workspaces(self, tokens):
+        tokens = set(tokens)
+        with self._lock:
+            for token in set(self.workspaces) - tokens:
+                self._unassign(self._worker_of(token), token)
+            for token in tokens - set(self.workspaces):
+                self.add_workspace(token)
+            self.rebalance()
+
+    def rebalance(self):
+        """Moves workspaces until shard sizes differ by at most one."""
+        with self._lock:
+            while True:
+                fullest = max(self._workers, key=lambda w: len(w.tokens))
+                emptiest = min(self._workers, key=lambda w: len(w.tokens))
+                if len(fullest.tokens) - len(emptiest.tokens) <= 1:
+                    return
+                token = min(fullest.tokens)
+                self._unassign(fullest, token)
+                self._assign(emptiest, token)
+
+    def _collect_reports(self, timeout):
+        # Waiting for workers does not hold `_lock`, so that it never blocks
+        # the monitor or workspace changes; `_reports_lock` keeps concurrent
+        # collections from taking each other's reports off the queue.
+        with self._reports_lock:
+            with self._lock:
+                report_id = next(self._report_ids)
+                workers = [w for w in self._workers if w.is_alive()]
+                for worker in workers:
+                    worker.commands.put(('report', report_id))
+
+            reports = {}
+            deadline = time.time() + timeout
+            while len(reports) < len(workers):
+                try:
+                    _, rid, index, report = self._results.get(
+                        timeout=max(deadline - time.time(), 0))
+                except queue.Empty:
+                    break
+                if rid == report_id:
+                    reports[index] = report
+            return reports
+
+    def health(self, timeout=10):
+        """Returns the state of every worker and of every workspace, which is
+        reported dead when its worker did not answer in time."""
+        reports = self._collect_reports(timeout)
+        with self._lock:
+            workers = {}
+            workspaces = {}
+            for worker in self._workers:
+                report = reports.get(worker.index, {})
+                workers[worker.index] = {
+                    'alive': worker.is_alive() and worker.index in reports,
+                    'restarts': worker.restarts,
+                    'workspaces': len(worker.tokens),
+                }
+                for token in worker.tokens:
+                    state = report.get(token, {'alive': False, 'restarts': 0, 'given_up': False})
+                    workspaces[workspace_id(token)] = {
+                        'worker': worker.index,
+                        'alive': state['alive'],
+                        'restarts': state['restarts'],
+                        'given_up': state['given_up'],
+                    }
+            return {'workers': workers, 'workspaces': workspaces}
+
+    def metrics(self, timeout=10):
+        """Returns the numeric stats of every workspace and their totals."""
+        reports = self._collect_reports(timeout)
+        workspaces = {}
+        totals = {}
+        for report in reports.values():
+            for token, state in report.items():
+                workspaces[workspace_id(token)] = state['stats']
+                for key, value in state['stats'].items():
+                    if key != 'uptime':
+                        totals[key] = totals.get(key, 0) + value
+        return {'workspaces': workspaces, 'total': totals}
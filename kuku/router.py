@@ -18,6 +18,12 @@ class BotRegistry(object):
             bot_ref = self._bot_refs.pop((user, channel))
             self._bot_ref_info.pop(bot_ref)
 
+    def __len__(self):
+        return len(self._bot_refs)
+
+    def __iter__(self):
+        return iter(list(self._bot_ref_info))
+
     def __contains__(self, item):
         if isinstance(item, tuple):
             return item in self._bot_refs
@@ -48,6 +54,7 @@ class SlackMessageRouterActor(base_actor):
     def __init__(self, *a, **k):
         super().__init__(*a, **k)
         self.registry = BotRegistry()
+        self.sessions = {}
         self.client_ref = k['client_ref']
         self.channels = k['channels']
         self.bot_id = k['bot_id']
@@ -56,6 +63,8 @@ class SlackMessageRouterActor(base_actor):
             for channel_id, channel in self.channels.items()
         }
         self.bots = k['bots']
+        self.routed_count = 0
+        self.state_log = k.get('state_log')
 
     def find_route(self, channel, text):
         for bot in self.bots:
@@ -79,30 +88,87 @@ class SlackMessageRouterActor(base_actor):
         if message.get('type') == 'bot_message':
             self.handle_bot_message(message)
         if message.get('type') == 'bye':
+            session = self.registry.get(bot_ref=message['bot_ref'])
             self.registry.remove(bot_ref=message['bot_ref'])
+            if session is not None:
+                self.sessions.pop(session, None)
+                if self.state_log is not None:
+                    self.state_log.delete(('session', ) + session)
+        if message.get('type') == 'stats':
+            return {
+                'conversations': len(self.registry),
+                'routed': self.routed_count,
+            }
+
+    def on_stop(self):
+        self.terminate_bots()
+
+    def on_failure(self, exception_type, exception_value, traceback):
+        # pykka calls this instead of on_stop when the router crashes.
+        self.terminate_bots()
+
+    def terminate_bots(self):
+        for bot_ref in self.registry:
+            bot_ref.tell({'type': 'terminate'})
 
     def handle_slack_message(self, message):
+        self.routed_count += 1
         slack_message = message['slack_message']
         user = slack_message['user']
         channel = slack_message['channel']
         text = slack_message['text']
 
+        if (user, channel) not in self.registry:
+            self.restore_session(user, channel)
+
         if (user, channel) not in self.registry:
             if self.is_initiate_message(text):
                 bot = self.find_route(channel, text)
                 if bot is not None:
-                    self.registry.add(user, channel, bot.start(
-                        router_ref=self.actor_ref,
-                        user=message.pop('user'),
-                        channel=message.pop('channel'),
-                        message=message
-                    ))
+                    self.start_session(bot, user, channel, {
+                        'bot': bot.__name__,
+                        'user': message.pop('user'),
+                        'channel': message.pop('channel'),
+                        'message': message
+                    })
         else:
             bot_ref = self.registry.get(user=user, channel=channel)
             if self.is_terminate_message(text):
                 bot_ref.tell({'type': 'terminate'})
             else:
                 bot_ref.tell(message)
+                if self.state_log is not None:
+                    session = self.sessions[(user, channel)]
+                    session['heard'].append(text)
+                    self.state_log.put(('session', user, channel), session)
+
+    def start_session(self, bot, user, channel, session, save=True):
+        session.setdefault('heard', [])
+        self.sessions[(user, channel)] = session
+        self.registry.add(user, channel, bot.start(
+            router_ref=self.actor_ref,
+            user=session['user'],
+            channel=session['channel'],
+            message=session['message'],
+            heard=list(session['heard'])
+        ))
+        if save and self.state_log is not None:
+            self.state_log.put(('session', user, channel), session)
+
+    def restore_session(self, user, channel):
+        """Restarts the bot of a session saved before a restart, if any. The
+        bot is given the messages it had heard so far and replays them without
+        replying, so the conversation resumes where it left off."""
+        if self.state_log is None:
+            return
+        session = self.state_log.get(('session', user, channel))
+        if session is None:
+            return
+        for bot in self.bots:
+            if bot.__name__ == session['bot']:
+                self.start_session(bot, user, channel, session, save=False)
+                return
+        self.state_log.delete(('session', user, channel))
 
     def handle_bot_message(self, message):
         self.client_ref.tell(message)
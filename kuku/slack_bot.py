@@ -30,6 +30,14 @@ class SlackBotActor(base_actor):
         self.user = k['user']
         self.channel = k['channel']
 
+        # Messages heard before the session was restored are heard again with
+        # the bot muted, so that it catches up without repeating its replies.
+        heard = k.get('heard', [])
+        self.replaying = len(heard)
+        self.muted = bool(heard)
+        for text in heard:
+            self.slack_inbox.put(text)
+
         self.future = run_coroutine(self.find_behavior(k['message']['slack_message']['text']))
         self.future.add_done_callback(self.bye)
 
@@ -54,6 +62,8 @@ class SlackBotActor(base_actor):
         await self.find_behavior(await self.hear())
 
     def say(self, text, attachments=None):
+        if self.muted:
+            return
         message = {
             'type': 'bot_message',
             'channel': self.channel['id'],
@@ -68,7 +78,12 @@ class SlackBotActor(base_actor):
         self.router_ref.tell(message)
 
     async def hear(self):
-        return await self.slack_inbox.get()
+        if not self.replaying:
+            self.muted = False
+        text = await self.slack_inbox.get()
+        if self.replaying:
+            self.replaying -= 1
+        return text
 
     def bye(self, *args):
         print('Sending bye...')
@@ -1,24 +1,48 @@
+import os
 import threading
 import time
 
 from slackclient import *
+from kuku.host import workspace_id
 from kuku.router import *
+from kuku.state_log import StateLog
 
 
 class SlackClientActor(base_actor):
     def __init__(self, *a, **k):
         super().__init__(*a, **k)
-        self.client = SlackClient(k['token'])
+        self.token = k['token']
+        self.client = SlackClient(self.token)
         self.router = k['router']
         self.bot_username = k['bot_username']
         self.router_ref = None
         self.channels = {}
         self.users = {}
         self.last_updated = None
+        self.started_at = time.time()
+        self.events_received = 0
+        self.messages_posted = 0
         self.slack_thread = threading.Thread(target=self._slack_loop)
+        self.state_dir = k.get('state_dir')
+        self.state_log = None
 
     def on_start(self):
-        self.update_slack_info()
+        try:
+            self.connect()
+        except Exception:
+            # pykka calls neither on_stop nor on_failure when on_start fails.
+            self.release()
+            raise
+
+    def connect(self):
+        if self.state_dir:
+            # One log per workspace, so it follows the workspace across hosts.
+            # Opening it waits for the client that had the workspace before,
+            # here or on another worker, to release it.
+            self.state_log = StateLog(os.path.join(
+                self.state_dir, '{}.log'.format(workspace_id(self.token))))
+        if not self.restore_slack_info():
+            self.update_slack_info()
         bot = [
             user for user in self.users.values()
             if user['name'] == self.bot_username and user['is_bot']
@@ -27,7 +51,8 @@ class SlackClientActor(base_actor):
         self.router_ref = self.router.start(
             client_ref=self.actor_ref,
             channels=self.channels,
-            bot_id=bot[0]['id']
+            bot_id=bot[0]['id'],
+            state_log=self.state_log
         )
         self.client.rtm_connect()
         self.slack_thread.start()
@@ -44,6 +69,23 @@ class SlackClientActor(base_actor):
             self.users = {user['id']: user for user in users}
 
         self.last_updated = time.time()
+        if self.state_log is not None:
+            self.state_log.put(('directory', ), {
+                'channels': self.channels,
+                'users': self.users,
+                'updated': self.last_updated,
+            })
+
+    def restore_slack_info(self):
+        if self.state_log is None:
+            return False
+        directory = self.state_log.get(('directory', ))
+        if directory is None or time.time() > directory['updated'] + 86400:
+            return False
+        self.channels = directory['channels']
+        self.users = directory['users']
+        self.last_updated = directory['updated']
+        return True
 
     def _slack_loop(self):
         print('Start listening Slack real time messages')
@@ -67,8 +109,39 @@ class SlackClientActor(base_actor):
             self.handle_bot_message(message)
         elif message.get('type') == 'update_slack_info':
             self.update_slack_info()
+        elif message.get('type') == 'stats':
+            return self.stats()
+
+    def on_stop(self):
+        self.release()
+
+    def on_failure(self, exception_type, exception_value, traceback):
+        # pykka calls this instead of on_stop when the client crashes.
+        self.release()
+
+    def release(self):
+        """Stops the router, and with it its bots, and closes the state log,
+        so that a restarted client does not run alongside them."""
+        if self.router_ref is not None:
+            self.router_ref.stop()
+            self.router_ref = None
+        if self.state_log is not None:
+            self.state_log.close()
+
+    def stats(self):
+        stats = {
+            'uptime': time.time() - self.started_at,
+            'events_received': self.events_received,
+            'messages_posted': self.messages_posted,
+            'channels': len(self.channels),
+            'users': len(self.users),
+        }
+        if self.router_ref is not None:
+            stats.update(self.router_ref.ask({'type': 'stats'}, timeout=5))
+        return stats
 
     def handle_slack_event(self, message):
+        self.events_received += 1
         if self.router_ref is None:
             return
 
@@ -92,4 +165,5 @@ class SlackClientActor(base_actor):
             })
 
     def handle_bot_message(self, message):
+        self.messages_posted += 1
         self.client.api_call('chat.postMessage', **message)
@@ -0,0 +1,274 @@
+import fcntl
+import mmap
+import os
+import pickle
+import struct
+from threading import Event, RLock, Thread
+import time
+import zlib
+
+__all__ = [
+    'StateLog'
+]
+
+
+_header = struct.Struct('<II')  # payload length, crc32 of payload
+
+
+def _parse(buf, offset, end):
+    """Yields (offset, length, key, present) of the valid records in
+    buf[offset:end], stopping at the first truncated or corrupt one."""
+    while offset + _header.size <= end:
+        size, crc = _header.unpack_from(buf, offset)
+        start = offset + _header.size
+        if start + size > end:
+            return
+        payload = buf[start:start + size]
+        if zlib.crc32(payload) != crc:
+            return
+        key, present, _ = pickle.loads(payload)
+        yield offset, _header.size + size, key, present
+        offset = start + size
+
+
+def _lock_exclusive(path, timeout):
+    # Returns the lock file once no other StateLog, in this process or any
+    # other, holds `path`; the lock goes away with the file.
+    lock_file = open(path + '.lock', 'a')
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return lock_file
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                lock_file.close()
+                raise TimeoutError('{} is held by another writer'.format(path))
+            time.sleep(0.1)
+
+
+class StateLog(object):
+    """ Append-only log of pickled key/value checkpoints.
+
+    Every `put` appends one record, so checkpoints cost a single write no
+    matter how many keys there are. Records are read back through a memory
+    map. Opening returns at once: the key index is built by a background
+    thread, and only reads wait for it. The index is checkpointed next to
+    the log every `compact_interval` seconds and on close, so reopening only
+    parses the records appended since. Once the log is more than
+    `compact_ratio` times larger than its live records, a background thread
+    rewrites it with the latest record of each key.
+
+    A log has a single writer: opening waits up to `lock_timeout` seconds
+    for its previous owner to close it, then raises TimeoutError.
+    """
+
+    def __init__(self, path, compact_ratio=2.0, compact_min_size=1 << 20, compact_interval=60,
+                 lock_timeout=30):
+        self.path = path
+        self.compact_ratio = compact_ratio
+        self.compact_min_size = compact_min_size
+        self._lock_file = _lock_exclusive(path, lock_timeout)
+        self._lock = RLock()
+        self._file = open(path, 'ab+')
+        self._size = self._file.seek(0, os.SEEK_END)
+        self._map = None
+        self._index = None
+        self._pending = []  # records appended while the index is being built
+        self._live_size = 0
+        self._indexed_size = None  # log size covered by the index checkpoint
+        self._index_ready = Event()
+        self._closed = Event()
+        Thread(target=self._build_index, args=[self._size], daemon=True).start()
+        Thread(target=self._compact_loop, args=[compact_interval], daemon=True).start()
+
+    def _mapped(self, end):
+        # Remaps once the log has grown past the current map.
+        if self._map is None or len(self._map) < end:
+            self._file.flush()
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def _snapshot_map(self):
+        # A map of its own for long scans, which the remapping in `_mapped`
+        # cannot close underneath.
+        self._file.flush()
+        return mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _apply(self, index, offset, length, key, present):
+        previous = index.pop(key, None)
+        if previous is not None:
+            self._live_size -= previous[1]
+        if present:
+            index[key] = (offset, length)
+            self._live_size += length
+
+    def _fingerprint(self, size):
+        # Tells this log apart from a compacted or rewritten one.
+        fd = self._file.fileno()
+        tail = os.pread(fd, min(size, 4096), max(size - 4096, 0))
+        return os.fstat(fd).st_ino, size, zlib.crc32(tail)
+
+    def _save_index(self):
+        with self._lock:
+            if self._index is None or self._file.closed or self._size == self._indexed_size:
+                return
+            self._file.flush()
+            checkpoint = (self._fingerprint(self._size), self._live_size, self._index)
+            index_path = self.path + '.index'
+            with open(index_path + '.tmp', 'wb') as out:
+                pickle.dump(checkpoint, out, pickle.HIGHEST_PROTOCOL)
+            os.replace(index_path + '.tmp', index_path)
+            self._indexed_size = self._size
+
+    def _load_index(self, end):
+        # Returns (size, live size, index) of the index checkpoint, or None if
+        # there is none or it does not match the log.
+        try:
+            with open(self.path + '.index', 'rb') as f:
+                fingerprint, live_size, index = pickle.load(f)
+            size = fingerprint[1]
+            if size > end or self._fingerprint(size) != fingerprint:
+                return None
+        except Exception:
+            return None
+        return size, live_size, index
+
+    def _build_index(self, end):
+        with self._lock:
+            checkpoint = self._load_index(end)
+        if checkpoint is None:
+            start, index = 0, {}
+        else:
+            start, self._live_size, index = checkpoint
+            self._indexed_size = start
+        valid_end = start
+        if end > start:
+            with self._lock:
+                buf = self._snapshot_map()
+            with buf:
+                for record in _parse(buf, start, end):
+                    self._apply(index, *record)
+                    valid_end = record[0] + record[1]
+        with self._lock:
+            for record in self._pending:
+                self._apply(index, *record)
+            self._pending = None
+            self._index = index
+            self._index_ready.set()
+        if valid_end < end:
+            # A torn or corrupt write, e.g. from a crash; rewriting drops it
+            # so that records appended after it stay readable.
+            self.compact()
+
+    def _append(self, key, present, value):
+        payload = pickle.dumps((key, present, value), pickle.HIGHEST_PROTOCOL)
+        record = _header.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            offset = self._size
+            self._file.write(record)
+            self._file.flush()
+            self._size += len(record)
+            if self._index is None:
+                self._pending.append((offset, len(record), key, present))
+            else:
+                self._apply(self._index, offset, len(record), key, present)
+
+    def put(self, key, value):
+        self._append(key, True, value)
+
+    def delete(self, key):
+        self._append(key, False, None)
+
+    def get(self, key, default=None):
+        self._index_ready.wait()
+        with self._lock:
+            location = self._index.get(key)
+            if location is None:
+                return default
+            offset, length = location
+            buf = self._mapped(offset + length)
+            payload = buf[offset + _header.size:offset + length]
+        return pickle.loads(payload)[2]
+
+    def __contains__(self, key):
+        self._index_ready.wait()
+        return key in self._index
+
+    def keys(self):
+        self._index_ready.wait()
+        with self._lock:
+            return list(self._index)
+
+    def _compact_loop(self, interval):
+        while not self._closed.wait(interval):
+            if not self._index_ready.is_set():
+                continue
+            if (self._size > self.compact_min_size and
+                    self._size > self._live_size * self.compact_ratio):
+                self.compact()
+            else:
+                self._save_index()
+
+    def compact(self):
+        """Rewrites the log with only the latest record of each live key."""
+        self._index_ready.wait()
+        with self._lock:
+            end = self._size
+            entries = sorted(self._index.items(), key=lambda item: item[1][0])
+            buf = self._snapshot_map() if end else b''
+
+        # Copying does not hold the lock; records appended meanwhile are
+        # carried over below.
+        compact_path = self.path + '.compact'
+        index = {}
+        position = 0
+        with open(compact_path, 'wb') as out:
+            for key, (offset, length) in entries:
+                out.write(buf[offset:offset + length])
+                index[key] = (position, length)
+                position += length
+
+            with self._lock:
+                self._file.flush()
+                tail = os.pread(self._file.fileno(), self._size - end, end)
+                out.write(tail)
+                live_size = sum(length for (_, length) in index.values())
+                for (offset, length, key, present) in _parse(tail, 0, len(tail)):
+                    previous = index.pop(key, None)
+                    if previous is not None:
+                        live_size -= previous[1]
+                    if present:
+                        index[key] = (position + offset, length)
+                        live_size += length
+                out.flush()
+                os.fsync(out.fileno())
+                os.replace(compact_path, self.path)
+                if end:
+                    buf.close()
+
+                if self._map is not None:
+                    self._map.close()
+                    self._map = None
+                self._file.close()
+                self._file = open(self.path, 'ab+')
+                self._size = position + len(tail)
+                self._index = index
+                self._live_size = live_size
+                self._indexed_size = None
+                self._save_index()
+
+    def close(self):
+        """Checkpoints the index and hands the log over to its next owner."""
+        self._closed.set()
+        with self._lock:
+            if self._file.closed:
+                return
+            self._save_index()
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self._file.close()
+            self._lock_file.close()
@@ -0,0 +1,169 @@
+from asyncio import gather, sleep, TimeoutError
+import unittest
+
+from kuku.core import base_actor, spawn
+from kuku.core.actor.base import behavior
+from kuku.core.actor.gateway import Gateway
+from kuku.core.actor.testing import TestRuntime
+
+
+class EchoActor(base_actor):
+    @behavior(str)
+    async def echo(self, message):
+        self.sender.reply(message.upper())
+
+
+class SleepyActor(base_actor):
+    @behavior(int)
+    async def sleep(self, seconds):
+        await sleep(seconds)
+        self.sender.reply(seconds)
+
+
+class FanOutActor(base_actor):
+    def before_start(self, target):
+        self.target = target
+
+    @behavior(tuple)
+    async def fan_out(self, message):
+        envelope = self.context.envelope
+        replies = await gather(*[self.target.ask(item) for item in message])
+        with self.context.msg_scope(envelope):
+            self.sender.reply(replies)
+
+
+class FailingActor(base_actor):
+    @behavior(str)
+    async def fail(self, message):
+        raise ValueError(message)
+
+
+class DelayedActor(base_actor):
+    def before_start(self, delay, error=None):
+        self.delay = delay
+        self.error = error
+
+    @behavior(str)
+    async def answer(self, message):
+        await sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        self.sender.reply(self.delay)
+
+
+class GatherActor(base_actor):
+    def before_start(self, targets):
+        self.targets = targets
+        self.strays = 0
+
+    @behavior(tuple)
+    async def gather(self, message):
+        quorum, timeout = message
+        envelope = self.context.envelope
+        result = await self.context.scatter_gather(
+            self.targets, 'go', quorum=quorum, timeout=timeout)
+        with self.context.msg_scope(envelope):
+            self.sender.reply((
+                sorted(result.replies.values()),
+                sorted(type(error).__name__ for error in result.errors.values()),
+                result.complete))
+
+    @behavior(int)
+    def stray(self, message):
+        self.strays += 1
+
+    @behavior(str)
+    def status(self, message):
+        self.sender.reply((self.strays, len(self.context.reply_inbox)))
+
+
+class AsyncAskTest(unittest.TestCase):
+    def setUp(self):
+        self.runtime = TestRuntime().start()
+
+    def tearDown(self):
+        self.runtime.stop()
+
+    def test_reply_from_coroutine_behavior(self):
+        echo = spawn(EchoActor)
+        self.assertEqual(self.runtime.ask(echo, 'hello'), 'HELLO')
+
+    def test_concurrent_behaviors_reply_to_their_own_sender(self):
+        fan_out = spawn(FanOutActor, spawn(SleepyActor))
+        self.assertEqual(self.runtime.ask(fan_out, (3, 1, 2)), [3, 1, 2])
+        self.assertEqual(self.runtime.time(), 3)
+
+    def test_error_is_forwarded_to_asker(self):
+        failing = spawn(FailingActor)
+        with self.assertRaises(ValueError):
+            self.runtime.ask(failing, 'boom')
+
+    def test_ask_from_outside_actors(self):
+        echo = spawn(EchoActor)
+        self.assertEqual(self.runtime.run_until_complete(echo.ask('hello')), 'HELLO')
+
+    def test_sender_is_rejected_outside_actors(self):
+        echo = spawn(EchoActor)
+        with self.assertRaises(TypeError):
+            echo.ask('hello', sender=echo)
+
+    def test_first_gateway_ask_gets_its_error(self):
+        # A new gateway, so that this is the first token it issues.
+        gateway = Gateway()
+        failing = spawn(FailingActor)
+        with self.assertRaises(ValueError):
+            self.runtime.run_until_complete(gateway.ask(failing, 'boom', timeout=5))
+
+    def test_gateway_ask_times_out_on_the_virtual_clock(self):
+        sleepy = spawn(SleepyActor)
+        with self.assertRaises(TimeoutError):
+            self.runtime.run_until_complete(sleepy.ask(30, timeout=5))
+        self.assertEqual(self.runtime.time(), 5)
+        self.assertEqual(self.runtime.run_until_complete(sleepy.ask(1, timeout=5)), 1)
+
+
+class ScatterGatherTest(unittest.TestCase):
+    def setUp(self):
+        self.runtime = TestRuntime().start()
+
+    def tearDown(self):
+        self.runtime.stop()
+
+    def gather(self, targets, quorum=None, timeout=10):
+        gatherer = spawn(GatherActor, [spawn(DelayedActor, *target) for target in targets])
+        return gatherer, self.runtime.ask(gatherer, (quorum, timeout))
+
+    def test_all_replies(self):
+        _, result = self.gather([(3, ), (1, ), (2, )])
+        self.assertEqual(result, ([1, 2, 3], [], True))
+        self.assertEqual(self.runtime.time(), 3)
+
+    def test_quorum(self):
+        _, result = self.gather([(3, ), (1, ), (2, )], quorum=2)
+        self.assertEqual(result, ([1, 2], [], True))
+        self.assertEqual(self.runtime.time(), 2)
+
+    def test_first_reply_wins(self):
+        _, result = self.gather([(3, ), (1, ), (2, )], quorum=1)
+        self.assertEqual(result, ([1], [], True))
+        self.assertEqual(self.runtime.time(), 1)
+
+    def test_timeout_returns_partial_results(self):
+        _, result = self.gather([(1, ), (2, ), (30, )], timeout=5)
+        self.assertEqual(result, ([1, 2], ['TimeoutError'], False))
+        self.assertEqual(self.runtime.time(), 5)
+
+    def test_error_from_one_target(self):
+        _, result = self.gather([(1, ), (2, ValueError('boom'))])
+        self.assertEqual(result, ([1], ['ValueError'], False))
+
+    def test_quorum_that_can_no_longer_be_reached(self):
+        _, result = self.gather([(1, ValueError('boom')), (2, ), (3, )], quorum=3)
+        self.assertEqual(result, ([], ['ValueError'], False))
+        self.assertEqual(self.runtime.time(), 1)
+
+    def test_late_replies_are_dropped(self):
+        gatherer, result = self.gather([(1, ), (2, ), (3, )], quorum=1)
+        self.assertEqual(result, ([1], [], True))
+        self.runtime.advance(5)
+        self.assertEqual(self.runtime.ask(gatherer, 'status'), (0, 0))
@@ -0,0 +1,128 @@
+from asyncio import gather, sleep
+import unittest
+from unittest import mock
+
+from kuku.core import base_actor, spawn
+from kuku.core.actor.base import behavior
+from kuku.core.actor.cache import cacheable, default_key
+from kuku.core.actor.context import ActorContext
+from kuku.core.actor.gateway import Gateway
+from kuku.core.actor.message import CacheInvalidate
+from kuku.core.actor.testing import TestRuntime
+
+
+class Lookup(object):
+    __slots__ = ('user_id', )
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+
+
+class ScopedLookup(Lookup):
+    __slots__ = ('team_id', )
+
+    def __init__(self, user_id, team_id):
+        super().__init__(user_id)
+        self.team_id = team_id
+
+
+class Search(object):
+    def __init__(self, terms):
+        self.terms = terms
+
+
+class DirectoryActor(base_actor):
+    def before_start(self):
+        self.fetches = []
+
+    @behavior(Lookup)
+    @cacheable(ttl=10)
+    async def lookup(self, message):
+        self.fetches.append(default_key(message))
+        count = len(self.fetches)
+        await sleep(1)
+        return count
+
+    @behavior(Search)
+    @cacheable()
+    def search(self, message):
+        self.fetches.append(message.terms)
+        return len(self.fetches)
+
+    @behavior(str)
+    def count_fetches(self, message):
+        self.sender.reply(len(self.fetches))
+
+
+class CallerActor(base_actor):
+    def before_start(self, directory):
+        self.directory = directory
+
+    @behavior(tuple)
+    async def call(self, messages):
+        envelope = self.context.envelope
+        replies = await gather(*[self.directory.ask(message) for message in messages])
+        with self.context.msg_scope(envelope):
+            self.sender.reply(replies)
+
+
+class CacheableTest(unittest.TestCase):
+    def setUp(self):
+        self.runtime = TestRuntime().start()
+        self.directory = spawn(DirectoryActor)
+
+    def tearDown(self):
+        self.runtime.stop()
+
+    def fetches(self):
+        return self.runtime.ask(self.directory, 'fetches')
+
+    def test_concurrent_asks_are_coalesced(self):
+        caller = spawn(CallerActor, self.directory)
+        replies = self.runtime.ask(caller, (Lookup(1), Lookup(1), Lookup(2)))
+        self.assertEqual(replies, [1, 1, 2])
+        self.assertEqual(self.fetches(), 2)
+        self.assertEqual(self.runtime.time(), 1)
+
+    def test_hits_are_answered_without_a_task(self):
+        self.assertEqual(self.runtime.ask(self.directory, Lookup(1)), 1)
+        runs = []
+        run = ActorContext.run_coroutine_behavior
+        with mock.patch.object(ActorContext, 'run_coroutine_behavior',
+                               lambda ctx, coro: runs.append(ctx.ref) or run(ctx, coro)):
+            self.assertEqual(self.runtime.ask(self.directory, Lookup(1)), 1)
+            self.assertEqual(self.runtime.ask(self.directory, Lookup(2)), 2)
+        self.assertEqual(runs.count(self.directory), 1)
+
+    def test_results_expire_after_ttl(self):
+        self.assertEqual(self.runtime.ask(self.directory, Lookup(1)), 1)
+        self.runtime.advance(5)
+        self.assertEqual(self.runtime.ask(self.directory, Lookup(1)), 1)
+        self.runtime.advance(10)
+        self.assertEqual(self.runtime.ask(self.directory, Lookup(1)), 2)
+
+    def test_invalidate(self):
+        self.assertEqual(self.runtime.ask(self.directory, Search('a')), 1)
+        self.assertEqual(self.runtime.ask(self.directory, Search('b')), 2)
+        self.directory.tell(CacheInvalidate('search', default_key(Search('a'))))
+        self.assertEqual(self.runtime.ask(self.directory, Search('a')), 3)
+        self.assertEqual(self.runtime.ask(self.directory, Search('b')), 2)
+        self.directory.tell(CacheInvalidate())
+        self.assertEqual(self.runtime.ask(self.directory, Search('b')), 4)
+
+    def test_inherited_slots_are_part_of_the_key(self):
+        self.assertNotEqual(default_key(ScopedLookup(1, 'a')), default_key(ScopedLookup(1, 'b')))
+        self.assertNotEqual(default_key(Lookup(1)), default_key(ScopedLookup(1, None)))
+        self.assertEqual(self.runtime.ask(self.directory, ScopedLookup(1, 'a')), 1)
+        self.assertEqual(self.runtime.ask(self.directory, ScopedLookup(1, 'b')), 2)
+
+    def test_unhashable_messages_are_not_cached(self):
+        self.assertEqual(self.runtime.ask(self.directory, Search(['a'])), 1)
+        self.assertEqual(self.runtime.ask(self.directory, Search(['a'])), 2)
+        self.assertEqual(self.runtime.ask(self.directory, Lookup([1])), 3)
+        self.assertEqual(self.fetches(), 3)
+
+    def test_first_gateway_ask_gets_its_result(self):
+        gateway = Gateway()
+        self.assertEqual(
+            self.runtime.run_until_complete(gateway.ask(self.directory, Search('a'), 5)), 1)
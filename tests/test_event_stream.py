@@ -0,0 +1,115 @@
+import unittest
+
+from kuku.core import get_cluster
+from kuku.core.actor.cluster import publish, subscribe, unsubscribe
+from kuku.core.actor.mailbox import deliver_each
+from kuku.core.actor.message import Envelope, SystemMessage
+from kuku.core.actor.testing import TestRuntime
+
+
+class Event(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class UserEvent(Event):
+    pass
+
+
+class EventStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.runtime = TestRuntime().start()
+
+    def tearDown(self):
+        self.runtime.stop()
+
+    def names(self, probe):
+        return [message.name for message in probe.messages]
+
+    def count_wakeups(self):
+        calls = []
+        call_soon_threadsafe = self.runtime.loop.call_soon_threadsafe
+
+        def counting(*args, **kwargs):
+            calls.append(args[0])
+            return call_soon_threadsafe(*args, **kwargs)
+
+        self.runtime.loop.call_soon_threadsafe = counting
+        return calls
+
+    def test_subscribe_by_type_matches_subclasses(self):
+        events, user_events = self.runtime.probe(), self.runtime.probe()
+        subscribe(events.ref, Event)
+        subscribe(user_events.ref, UserEvent)
+        publish(Event('a'))
+        publish(UserEvent('b'))
+        self.runtime.run_until_idle()
+        self.assertEqual(self.names(events), ['a', 'b'])
+        self.assertEqual(self.names(user_events), ['b'])
+
+    def test_subscribe_by_topic(self):
+        news, events = self.runtime.probe(), self.runtime.probe()
+        subscribe(news.ref, 'news')
+        subscribe(events.ref, Event)
+        publish(Event('a'), 'news')
+        publish(Event('b'), 'weather')
+        self.runtime.run_until_idle()
+        self.assertEqual(self.names(news), ['a'])
+        self.assertEqual(events.messages, [])
+
+    def test_matching_several_types_delivers_once(self):
+        probe, other = self.runtime.probe(), self.runtime.probe()
+        subscribe(probe.ref, Event)
+        subscribe(probe.ref, UserEvent)
+        subscribe(other.ref, UserEvent)
+        publish(UserEvent('a'))
+        self.runtime.run_until_idle()
+        self.assertEqual(self.names(probe), ['a'])
+        self.assertEqual(self.names(other), ['a'])
+
+    def test_unsubscribe(self):
+        probe = self.runtime.probe()
+        subscribe(probe.ref, Event)
+        subscribe(probe.ref, 'news')
+        unsubscribe(probe.ref, Event)
+        publish(Event('a'))
+        publish(Event('b'), 'news')
+        unsubscribe(probe.ref)
+        publish(Event('c'), 'news')
+        self.runtime.run_until_idle()
+        self.assertEqual(self.names(probe), ['b'])
+
+    def test_one_wakeup_per_loop(self):
+        probes = [self.runtime.probe() for _ in range(3)]
+        for probe in probes:
+            subscribe(probe.ref, Event)
+        self.runtime.run_until_idle()
+        wakeups = self.count_wakeups()
+        publish(Event('a'))
+        self.assertEqual(len(wakeups), 1)
+        self.runtime.run_until_idle()
+        for probe in probes:
+            self.assertEqual(self.names(probe), ['a'])
+
+    def test_deliver_each_wakes_each_loop_once(self):
+        probes = [self.runtime.probe() for _ in range(3)]
+        self.runtime.run_until_idle()
+        wakeups = self.count_wakeups()
+        deliver_each({self.runtime.loop: [
+            (probe.ref._mailbox, Envelope(Event(str(i)), None))
+            for (i, probe) in enumerate(probes)]})
+        self.assertEqual(len(wakeups), 1)
+        self.runtime.run_until_idle()
+        self.assertEqual([self.names(probe) for probe in probes], [['0'], ['1'], ['2']])
+
+    def test_subscriptions_end_with_the_subscriber(self):
+        probe, other = self.runtime.probe(), self.runtime.probe()
+        subscribe(probe.ref, Event)
+        subscribe(other.ref, Event)
+        probe.ref.tell(SystemMessage.kill())
+        self.runtime.run_until_idle()
+        self.assertNotIn(probe.ref.actor_uuid, get_cluster().event_stream._topics)
+        publish(Event('a'))
+        self.runtime.run_until_idle()
+        self.assertEqual(self.names(other), ['a'])
+        self.assertEqual(probe.messages, [])
@@ -0,0 +1,92 @@
+import time
+import unittest
+from unittest import mock
+
+from kuku.host import WorkspaceHost, workspace_id
+
+
+def stub_worker(index, bots, bot_username, state_dir, check_interval, restart_limit,
+                commands, results):
+    """Stands in for `workspace_worker`, reporting every workspace it was
+    given as alive, with its token's length as its 'routed' count."""
+    tokens = set()
+    while True:
+        command = commands.get()
+        if command[0] == 'start':
+            tokens.add(command[1])
+        elif command[0] == 'stop':
+            tokens.discard(command[1])
+        elif command[0] == 'report':
+            results.put(('report', command[1], index, {
+                token: {'alive': True, 'restarts': 0, 'given_up': False,
+                        'stats': {'routed': len(token), 'uptime': 1}}
+                for token in tokens}))
+        elif command[0] == 'shutdown':
+            return
+
+
+class ShardingTest(unittest.TestCase):
+    def setUp(self):
+        self.host = WorkspaceHost([], worker_count=3)
+
+    def sizes(self):
+        return sorted(len(worker.tokens) for worker in self.host._workers)
+
+    def test_workspaces_go_to_the_emptiest_worker(self):
+        for i in range(7):
+            self.host.add_workspace('token-{}'.format(i))
+        self.host.add_workspace('token-0')
+        self.assertEqual(self.sizes(), [2, 2, 3])
+        self.assertEqual(len(self.host.workspaces), 7)
+
+    def test_removals_rebalance_the_shards(self):
+        for i in range(6):
+            self.host.add_workspace('token-{}'.format(i))
+        index = self.host.workspaces['token-0']
+        for token in sorted(self.host._workers[index].tokens):
+            self.host.remove_workspace(token)
+        self.assertEqual(self.sizes(), [1, 1, 2])
+        self.assertNotIn('token-0', self.host.workspaces)
+
+    def test_set_workspaces(self):
+        for i in range(6):
+            self.host.add_workspace('token-{}'.format(i))
+        self.host.set_workspaces(['token-0', 'token-1', 'other'])
+        self.assertEqual(set(self.host.workspaces), {'token-0', 'token-1', 'other'})
+        self.assertEqual(self.sizes(), [1, 1, 1])
+
+
+class HostTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch('kuku.host.workspace_worker', stub_worker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.host = WorkspaceHost([], worker_count=2, check_interval=0.1)
+        self.host.start()
+        self.addCleanup(self.host.stop)
+        for token in ('a', 'bb', 'ccc'):
+            self.host.add_workspace(token)
+
+    def test_health(self):
+        health = self.host.health()
+        self.assertEqual(health['workers'], {
+            0: {'alive': True, 'restarts': 0, 'workspaces': 2},
+            1: {'alive': True, 'restarts': 0, 'workspaces': 1},
+        })
+        self.assertEqual(health['workspaces'][workspace_id('bb')], {
+            'worker': 1, 'alive': True, 'restarts': 0, 'given_up': False})
+
+    def test_metrics(self):
+        metrics = self.host.metrics()
+        self.assertEqual(metrics['total'], {'routed': 6})
+        self.assertEqual(metrics['workspaces'][workspace_id('ccc')], {'routed': 3, 'uptime': 1})
+
+    def test_dead_worker_is_respawned_with_its_shard(self):
+        worker = self.host._workers[0]
+        worker.process.kill()
+        deadline = time.monotonic() + 30
+        while worker.restarts == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        health = self.host.health()
+        self.assertEqual(health['workers'][0]['restarts'], 1)
+        self.assertTrue(all(state['alive'] for state in health['workspaces'].values()))
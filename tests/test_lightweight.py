@@ -0,0 +1,89 @@
+from asyncio import all_tasks
+import unittest
+
+from kuku.core import base_actor, spawn
+from kuku.core.actor.base import behavior
+from kuku.core.actor.testing import TestRuntime
+
+
+class CounterActor(base_actor):
+    lightweight = True
+
+    def before_start(self):
+        self.seen = []
+
+    @behavior(int)
+    def record(self, message):
+        self.seen.append(message)
+
+    @behavior(str)
+    def handle(self, message):
+        self.sender.reply((message, list(self.seen)))
+
+
+class RelayActor(base_actor):
+    lightweight = True
+
+    def before_start(self, target):
+        self.target = target
+
+    @behavior(tuple)
+    async def relay(self, message):
+        envelope = self.context.envelope
+        reply = await self.target.ask(message[0])
+        with self.context.msg_scope(envelope):
+            self.sender.reply(reply)
+
+
+def actor_of(ref):
+    # A lightweight mailbox wakes its actor through its bound `_schedule`.
+    return ref._mailbox._on_ready.__self__
+
+
+class LightweightActorTest(unittest.TestCase):
+    def setUp(self):
+        self.runtime = TestRuntime().start()
+
+    def tearDown(self):
+        self.runtime.stop()
+
+    def actor_tasks(self, actor):
+        return [task for task in all_tasks(self.runtime.loop)
+                if getattr(task, 'actor_ctx', None) is actor._context]
+
+    def test_context_is_created_on_the_first_message(self):
+        ref = spawn(CounterActor)
+        actor = actor_of(ref)
+        self.runtime.run_until_idle()
+        self.assertIsNone(actor._context)
+        ref.tell(1)
+        self.runtime.run_until_idle()
+        self.assertIsNotNone(actor._context)
+
+    def test_no_task_while_idle(self):
+        ref = spawn(CounterActor)
+        actor = actor_of(ref)
+        ref.tell(1)
+        self.assertIsNone(actor.execution)
+        self.runtime.step()
+        self.assertIsNotNone(actor.execution)
+        self.runtime.run_until_idle()
+        self.assertIsNone(actor.execution)
+        self.assertEqual(self.actor_tasks(actor), [])
+
+    def test_messages_keep_their_order(self):
+        ref = spawn(CounterActor)
+        for i in range(50):
+            ref.tell(i)
+            if i % 7 == 0:
+                self.runtime.step()
+        self.assertEqual(self.runtime.ask(ref, 'seen'), ('seen', list(range(50))))
+
+    def test_ask_and_reply(self):
+        counter = spawn(CounterActor)
+        relay = spawn(RelayActor, counter)
+        counter.tell(1)
+        self.assertEqual(self.runtime.ask(relay, ('seen', )), ('seen', [1]))
+        self.runtime.run_until_idle()
+        self.assertIsNone(actor_of(relay).execution)
+        self.assertEqual(self.actor_tasks(actor_of(relay)), [])
@@ -0,0 +1,69 @@
+from asyncio import get_running_loop
+import unittest
+
+from kuku.core import base_actor, spawn
+from kuku.core.actor.base import behavior
+from kuku.core.actor.cluster import ActorCluster, ActorRegistry
+from kuku.core.actor.testing import VirtualTimeLoop
+
+
+class RecorderActor(base_actor):
+    lightweight = True
+
+    def before_start(self, seen):
+        self.seen = seen
+
+    @behavior(int)
+    def record(self, message):
+        self.seen.append((message, get_running_loop()))
+
+
+class MigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.hot = VirtualTimeLoop()
+        self.cold = VirtualTimeLoop()
+        self.saved = ActorCluster.instance
+        ActorCluster.instance = None
+        self.cluster = ActorCluster.instance = ActorCluster(
+            ActorRegistry(), loops=[self.hot, self.cold])
+        # Every actor starts on the hot loop.
+        self.cluster.get_loop = lambda: self.hot
+
+    def tearDown(self):
+        ActorCluster.instance = self.saved
+        self.hot.close()
+        self.cold.close()
+
+    def test_rebalance_moves_busy_actors_in_order(self):
+        seen = [[] for _ in range(4)]
+        refs = [spawn(RecorderActor, s) for s in seen]
+        for i in range(60):
+            for ref in refs:
+                ref.tell(i)
+        self.hot.run_until_idle()
+
+        self.cluster.rebalance()
+        self.hot.run_until_idle()
+        moved = [ref for ref in refs if ref._mailbox.loop is self.cold]
+        self.assertEqual(len(moved), 2)
+        for ref in moved:
+            self.assertIs(ref._mailbox.stats, self.cluster.loop_stats(self.cold))
+
+        for i in range(60, 120):
+            for ref in refs:
+                ref.tell(i)
+        self.hot.run_until_idle()
+        self.cold.run_until_idle()
+        for (ref, messages) in zip(refs, seen):
+            self.assertEqual([message for (message, _) in messages], list(range(120)))
+            loop = self.cold if ref in moved else self.hot
+            self.assertEqual({loop for (_, loop) in messages[60:]}, {loop})
+
+    def test_balanced_loops_are_left_alone(self):
+        ref = spawn(RecorderActor, [])
+        for i in range(10):
+            ref.tell(i)
+        self.hot.run_until_idle()
+        self.cluster.rebalance()
+        self.hot.run_until_idle()
+        self.assertIs(ref._mailbox.loop, self.hot)
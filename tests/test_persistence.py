@@ -0,0 +1,121 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from kuku.core import base_actor, spawn
+from kuku.core.actor.base import behavior, type_path
+from kuku.core.actor.message import SystemMessage
+from kuku.core.actor.persistence import enable_persistence
+from kuku.core.actor.testing import TestRuntime
+from kuku.state_log import StateLog
+
+
+class CounterActor(base_actor):
+    persistent_state = ('count', 'tags')
+
+    def before_start(self):
+        self.count = 0
+        self.tags = []
+
+    def persistence_key(self):
+        return 'counter'
+
+    @behavior(str)
+    def handle(self, message):
+        if message == 'fail':
+            raise ValueError(message)
+        if message == 'increment':
+            self.count += 1
+        if message.startswith('tag:'):
+            self.tags.append(message[4:])
+            self.mark_dirty('tags')
+        self.sender.reply(self.count)
+
+
+class PersistenceTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.runtime = TestRuntime().start()
+        self.log = enable_persistence(os.path.join(self.dir, 'actors.log'))
+
+    def tearDown(self):
+        self.runtime.stop()
+        self.log.close()
+        shutil.rmtree(self.dir)
+
+    def test_restart_restores_checkpointed_state(self):
+        counter = spawn(CounterActor)
+        self.runtime.ask(counter, 'increment')
+        self.runtime.ask(counter, 'increment')
+        with self.assertRaises(ValueError):
+            self.runtime.ask(counter, 'fail')
+        self.assertEqual(self.runtime.ask(counter, 'get'), 2)
+
+    def checkpoint(self):
+        return self.log.get((type_path(CounterActor), 'counter'))
+
+    def test_only_assigned_state_is_written(self):
+        puts = []
+        put = self.log.put
+        self.log.put = lambda key, value: puts.append(key) or put(key, value)
+        counter = spawn(CounterActor)
+        self.runtime.ask(counter, 'get')
+        self.assertEqual(puts, [])
+        self.runtime.ask(counter, 'increment')
+        self.runtime.ask(counter, 'get')
+        self.assertEqual(len(puts), 1)
+        self.runtime.ask(counter, 'tag:a')
+        self.assertEqual(len(puts), 2)
+
+    def test_state_outlives_a_plain_kill(self):
+        counter = spawn(CounterActor)
+        self.runtime.ask(counter, 'increment')
+        self.runtime.ask(counter, 'tag:a')
+        counter.tell(SystemMessage.kill())
+        self.runtime.run_until_idle()
+        self.assertIsNotNone(self.checkpoint())
+
+        counter = spawn(CounterActor)
+        self.assertEqual(self.runtime.ask(counter, 'increment'), 2)
+        self.runtime.ask(counter, 'tag:b')
+        state = pickle.loads(self.checkpoint())
+        self.assertEqual(pickle.loads(state['tags']), ['a', 'b'])
+
+        counter.tell(SystemMessage.kill(forget_state=True))
+        self.runtime.run_until_idle()
+        self.assertIsNone(self.checkpoint())
+
+
+class StateLogTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'state.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_reopening_loads_the_index_checkpoint(self):
+        log = StateLog(self.path)
+        for i in range(100):
+            log.put(i % 10, i)
+        log.close()
+
+        log = StateLog(self.path)
+        self.assertEqual(log.get(3), 93)
+        self.assertEqual(log._indexed_size, log._size)
+        log.put('late', 1)
+        log.close()
+
+        os.remove(self.path + '.index')
+        log = StateLog(self.path)
+        self.assertEqual(sorted(log.keys(), key=str), list(range(10)) + ['late'])
+        log.close()
+
+    def test_single_writer(self):
+        log = StateLog(self.path)
+        with self.assertRaises(TimeoutError):
+            StateLog(self.path, lock_timeout=0.2)
+        log.close()
+        StateLog(self.path, lock_timeout=0.2).close()
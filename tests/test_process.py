@@ -0,0 +1,72 @@
+import os
+import time
+import unittest
+
+from kuku.core import base_actor, configure_cluster, get_cluster, spawn
+from kuku.core.actor import cluster
+from kuku.core.actor.base import behavior
+from kuku.core.actor.cluster import ActorCluster
+
+
+class WorkerActor(base_actor):
+    def before_start(self, offset):
+        self.offset = offset
+        self.calls = 0
+
+    @behavior(int)
+    def add(self, message):
+        self.calls += 1
+        self.sender.reply((message + self.offset, self.calls, os.getpid()))
+
+    @behavior(bytes)
+    def size(self, message):
+        self.sender.reply(len(message))
+
+    @behavior(str)
+    def fail(self, message):
+        raise ValueError(message)
+
+
+class ProcessPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = ActorCluster.instance
+        ActorCluster.instance = None
+        configure_cluster(process_count=1)
+        self.cluster = get_cluster()
+
+    def tearDown(self):
+        self.cluster.get_pool().close()
+        for loop in self.cluster._loops.values():
+            loop.call_soon_threadsafe(loop.stop)
+        ActorCluster.instance = self.saved
+        cluster._settings.pop('process_count')
+
+    def test_isolated_actor_runs_in_a_worker(self):
+        worker = spawn(WorkerActor, 10, isolated=True)
+        total, calls, pid = worker.ask(1).result(30)
+        self.assertEqual((total, calls), (11, 1))
+        self.assertNotEqual(pid, os.getpid())
+        with self.assertRaises(ValueError):
+            worker.ask('boom').result(10)
+
+    def test_large_messages(self):
+        worker = spawn(WorkerActor, 0, isolated=True)
+        self.assertEqual(worker.ask(b'x' * (1 << 20)).result(30), 1 << 20)
+
+    def test_worker_restarts_with_its_actors(self):
+        worker = spawn(WorkerActor, 10, isolated=True)
+        worker.ask(1).result(30)
+        _, calls, pid = worker.ask(2).result(10)
+        self.assertEqual(calls, 2)
+
+        pool = self.cluster.get_pool()
+        pool._workers[0].process.kill()
+        deadline = time.monotonic() + 30
+        while pool.restarts == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(pool.restarts, 1)
+
+        # Spawned again from its original arguments; its state is gone.
+        total, calls, new_pid = worker.ask(3).result(30)
+        self.assertEqual((total, calls), (13, 1))
+        self.assertNotEqual(new_pid, pid)
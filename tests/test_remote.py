@@ -0,0 +1,90 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from kuku.core import base_actor, get_actors, get_cluster, spawn, start_node
+from kuku.core.actor.base import behavior
+from kuku.core.actor.cluster import ActorCluster
+
+
+class StoreActor(base_actor):
+    announced = True
+
+    def before_start(self):
+        self.value = None
+
+    @behavior(tuple)
+    def store(self, message):
+        self.value = message[1]
+
+    @behavior(str)
+    def handle(self, message):
+        if message == 'fail':
+            raise ValueError(message)
+        self.sender.reply((message, self.value))
+
+
+class HiddenActor(base_actor):
+    pass
+
+
+def serve(address, ready):
+    """Runs a node hosting a StoreActor until the process is terminated."""
+    start_node(address)
+    spawn(StoreActor)
+    spawn(HiddenActor)
+    ready.put(True)
+    while True:
+        time.sleep(60)
+
+
+class RemoteTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        context = multiprocessing.get_context('spawn')
+        ready = context.Queue()
+        remote_address = os.path.join(self.dir, 'remote.sock')
+        self.process = context.Process(target=serve, args=(remote_address, ready), daemon=True)
+        self.process.start()
+        ready.get(timeout=30)
+
+        self.saved = ActorCluster.instance
+        ActorCluster.instance = None
+        self.cluster = get_cluster()
+        start_node(os.path.join(self.dir, 'local.sock'), join=[remote_address])
+        deadline = time.monotonic() + 10
+        while not get_actors(StoreActor) and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def tearDown(self):
+        self.process.terminate()
+        self.process.join()
+        for loop in self.cluster._loops.values():
+            loop.call_soon_threadsafe(loop.stop)
+        self.cluster.node.loop.call_soon_threadsafe(self.cluster.node.loop.stop)
+        ActorCluster.instance = self.saved
+        shutil.rmtree(self.dir)
+
+    def remote_store(self):
+        refs = list(get_actors(StoreActor))
+        self.assertEqual(len(refs), 1)
+        return refs[0]
+
+    def test_only_announced_actors_are_mirrored(self):
+        self.assertEqual(self.remote_store().actor_uuid[0], self.process_node_id())
+        self.assertEqual(get_actors(HiddenActor), set())
+
+    def process_node_id(self):
+        return next(iter(self.cluster.node._peers))
+
+    def test_tell_and_ask(self):
+        store = self.remote_store()
+        store.tell(('store', 42))
+        self.assertEqual(store.ask('get').result(10), ('get', 42))
+
+    def test_error_is_forwarded(self):
+        with self.assertRaises(ValueError):
+            self.remote_store().ask('fail').result(10)
@@ -0,0 +1,74 @@
+import unittest
+
+from kuku.core import base_actor, spawn, SystemMessage
+from kuku.core.actor.base import behavior
+from kuku.core.actor.testing import TestRuntime
+
+
+class TickerActor(base_actor):
+    def before_start(self, interval, ticks):
+        self.ticks = ticks
+        self.timer = self.context.schedule_repeat(interval, 'tick')
+
+    @behavior(str)
+    def tick(self, message):
+        if message == 'stop':
+            self.timer.cancel()
+        else:
+            self.ticks.append(self.context.loop.time())
+
+
+class ReminderActor(base_actor):
+    def before_start(self, reminders):
+        self.reminders = reminders
+
+    @behavior(float)
+    def remind_later(self, delay):
+        self.context.schedule_once(delay, 'reminder', target=self.sender)
+
+    @behavior(str)
+    def remind(self, message):
+        self.reminders.append((message, self.context.loop.time()))
+
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.runtime = TestRuntime().start()
+
+    def tearDown(self):
+        self.runtime.stop()
+
+    def test_repeat_from_before_start(self):
+        ticks = []
+        spawn(TickerActor, 1.0, ticks)
+        self.runtime.advance(3.5)
+        self.assertEqual(ticks, [1.0, 2.0, 3.0])
+
+    def test_cancel_stops_repeating(self):
+        ticks = []
+        ticker = spawn(TickerActor, 1.0, ticks)
+        self.runtime.advance(2.5)
+        ticker.tell('stop')
+        self.runtime.advance(10)
+        self.assertEqual(len(ticks), 2)
+
+    def test_schedule_once_to_other_actor(self):
+        reminders = []
+        target = spawn(ReminderActor, reminders)
+        probe = self.runtime.probe()
+        spawn(ReminderActor, []).tell(0.5, sender=probe.ref)
+        spawn(ReminderActor, []).tell(2.0, sender=target)
+        self.runtime.advance(1)
+        self.assertEqual(probe.expect(str), 'reminder')
+        self.assertEqual(reminders, [])
+        self.runtime.advance(1)
+        self.assertEqual(reminders, [('reminder', 2.0)])
+
+    def test_restart_cancels_timers(self):
+        ticks = []
+        ticker = spawn(TickerActor, 1.0, ticks)
+        self.runtime.advance(1.5)
+        ticker.tell(SystemMessage.restart())
+        self.runtime.advance(1.0)
+        # Only the timer scheduled by the restarted actor is left.
+        self.assertEqual(ticks, [1.0, 2.5])
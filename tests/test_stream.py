@@ -0,0 +1,57 @@
+import unittest
+
+from kuku.core import base_actor, spawn, Complete, Offer, Sink, Source
+from kuku.core.actor.base import behavior
+from kuku.core.actor.testing import TestRuntime
+
+
+class ProducerActor(base_actor):
+    def before_start(self, queue, accepted):
+        self.queue = queue
+        self.accepted = accepted
+
+    @behavior(list)
+    async def produce(self, items):
+        for item in items:
+            self.accepted.append((item, await self.queue.ask(Offer(item))))
+        self.queue.tell(Complete())
+
+
+class StreamTest(unittest.TestCase):
+    def setUp(self):
+        self.runtime = TestRuntime().start()
+
+    def tearDown(self):
+        self.runtime.stop()
+
+    def test_map_and_filter(self):
+        flow = (Source.from_iterable(range(10))
+                .map(lambda x: x * x)
+                .filter(lambda x: x % 2 == 0)
+                .run_collect())
+        self.assertEqual(self.runtime.run_until_complete(flow.completion), [0, 4, 16, 36, 64])
+
+    def test_fold(self):
+        flow = Source.from_iterable(range(5)).run_with(Sink.fold(0, lambda total, x: total + x))
+        self.assertEqual(self.runtime.run_until_complete(flow.completion), 10)
+
+    def test_throttle_runs_on_virtual_time(self):
+        flow = Source.from_iterable(range(6)).throttle(2, 1.0).run_collect()
+        self.assertEqual(self.runtime.run_until_complete(flow.completion), list(range(6)))
+        self.assertEqual(self.runtime.time(), 2.0)
+
+    def test_group_within(self):
+        flow = Source.from_iterable(range(5)).group_within(2, 1.0).run_collect()
+        self.assertEqual(self.runtime.run_until_complete(flow.completion), [[0, 1], [2, 3], [4]])
+
+    def test_failure_fails_completion(self):
+        flow = Source.from_iterable([1, 0]).map(lambda x: 1 / x).run_collect()
+        with self.assertRaises(ZeroDivisionError):
+            self.runtime.run_until_complete(flow.completion)
+
+    def test_queue_source(self):
+        flow = Source.queue(size=2).map(str).run_collect()
+        accepted = []
+        spawn(ProducerActor, flow.source, accepted).tell([1, 2, 3])
+        self.assertEqual(self.runtime.run_until_complete(flow.completion), ['1', '2', '3'])
+        self.assertEqual(accepted, [(1, True), (2, True), (3, True)])
@@ -0,0 +1,85 @@
+import unittest
+
+from kuku.core import AllForOne, base_actor, get_actor_by_uuid, OneForOne, spawn
+from kuku.core.actor.base import behavior
+from kuku.core.actor.message import SystemMessage
+from kuku.core.actor.testing import TestRuntime
+
+
+class ChildActor(base_actor):
+    @behavior(str)
+    def handle(self, message):
+        if message == 'fail':
+            raise ValueError(message)
+        self.sender.reply(self.restart_count)
+
+
+class ParentActor(base_actor):
+    supervisor_strategy = OneForOne(max_restarts=2, within=60, min_backoff=1, max_backoff=4)
+
+    def before_start(self):
+        self.first = self.context.spawn(ChildActor)
+        self.second = self.context.spawn(ChildActor)
+
+    @behavior(str)
+    def handle(self, message):
+        if message == 'children':
+            self.sender.reply((self.first, self.second))
+        else:
+            self.sender.reply(self.restart_count)
+
+
+class AllForOneParentActor(ParentActor):
+    supervisor_strategy = AllForOne(max_restarts=2, within=60, min_backoff=1, max_backoff=4)
+
+
+class SupervisionTest(unittest.TestCase):
+    def setUp(self):
+        self.runtime = TestRuntime().start()
+
+    def tearDown(self):
+        self.runtime.stop()
+
+    def spawn_family(self, parent_type=ParentActor):
+        parent = spawn(parent_type)
+        return (parent, ) + self.runtime.ask(parent, 'children')
+
+    def test_one_for_one_restarts_only_the_failed_child(self):
+        _, first, second = self.spawn_family()
+        first.tell('fail')
+        self.assertEqual(self.runtime.ask(first, 'count'), 1)
+        self.assertEqual(self.runtime.ask(second, 'count'), 0)
+
+    def test_all_for_one_restarts_every_child(self):
+        _, first, second = self.spawn_family(AllForOneParentActor)
+        first.tell('fail')
+        self.assertEqual(self.runtime.ask(first, 'count'), 1)
+        self.assertEqual(self.runtime.ask(second, 'count'), 1)
+
+    def test_restarts_back_off(self):
+        _, first, _ = self.spawn_family()
+        first.tell('fail')
+        self.assertEqual(self.runtime.ask(first, 'count'), 1)
+        self.assertEqual(self.runtime.time(), 1)
+        first.tell('fail')
+        self.assertEqual(self.runtime.ask(first, 'count'), 2)
+        self.assertEqual(self.runtime.time(), 3)
+
+    def test_failure_escalates_once_restarts_run_out(self):
+        parent, first, second = self.spawn_family()
+        for _ in range(3):
+            first.tell('fail')
+            self.runtime.advance(10)
+        self.assertIsNone(get_actor_by_uuid(first.actor_uuid))
+        self.assertEqual(self.runtime.ask(parent, 'count'), 1)
+        self.assertEqual(self.runtime.ask(second, 'count'), 0)
+
+    def test_child_of_a_dead_parent_stops_when_it_fails(self):
+        parent, first, _ = self.spawn_family()
+        parent.tell(SystemMessage.kill())
+        self.runtime.run_until_idle()
+        first.tell('fail')
+        first.tell('count')
+        self.runtime.advance(10)
+        self.assertIsNone(get_actor_by_uuid(first.actor_uuid))
+        self.assertEqual(self.runtime.pending(first), [])
@@ -0,0 +1,103 @@
+import cProfile
+import time
+import unittest
+from unittest import mock
+
+from kuku.core import base_actor, configure_cluster, get_cluster, spawn
+from kuku.core.actor import cluster
+from kuku.core.actor.base import behavior
+from kuku.core.actor.cluster import ActorCluster
+from kuku.core.actor.testing import TestRuntime
+from kuku.core.actor.watchdog import (
+    BehaviorProfiler, disable_profiling, enable_profiling, SamplingProfiler)
+
+
+def busy_wait(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class BlockingActor(base_actor):
+    @behavior(float)
+    def block(self, seconds):
+        time.sleep(seconds)
+
+    @behavior(str)
+    def handle(self, message):
+        busy_wait(0.02)
+        self.sender.reply(message)
+
+
+class BusyProfile(cProfile.Profile):
+    def enable(self, *args, **kwargs):
+        raise ValueError('Another profiling tool is already active')
+
+
+class LoopWatchdogTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = ActorCluster.instance
+        ActorCluster.instance = None
+        configure_cluster(stall_threshold=0.05)
+        self.cluster = get_cluster()
+
+    def tearDown(self):
+        for watchdog in self.cluster.watchdogs:
+            watchdog.stop()
+        for loop in self.cluster._loops.values():
+            loop.call_soon_threadsafe(loop.stop)
+        ActorCluster.instance = self.saved
+        cluster._settings.pop('stall_threshold')
+
+    def test_stall_is_labeled_with_the_blocking_behavior(self):
+        spawn(BlockingActor).tell(0.3)
+        deadline = time.monotonic() + 10
+        while (not self.cluster.stalls() or self.cluster.stalls()[0].duration is None) \
+                and time.monotonic() < deadline:
+            time.sleep(0.01)
+        stall = self.cluster.stalls()[0]
+        self.assertIs(stall.actor_type, BlockingActor)
+        self.assertIs(stall.message_type, float)
+        self.assertGreaterEqual(stall.duration, 0.25)
+        self.assertTrue(any('time.sleep' in line for line in stall.stack))
+
+
+class ProfilingTest(unittest.TestCase):
+    def setUp(self):
+        self.runtime = TestRuntime().start()
+        self.actor = spawn(BlockingActor)
+
+    def tearDown(self):
+        disable_profiling(BlockingActor)
+        self.runtime.stop()
+
+    def test_cprofile(self):
+        profiler = enable_profiling(BlockingActor)
+        for _ in range(3):
+            self.runtime.ask(self.actor, 'work')
+        self.assertIs(disable_profiling(BlockingActor), profiler)
+        self.assertNotIn('_profiler', BlockingActor.__dict__)
+        self.runtime.ask(self.actor, 'work')
+
+        self.assertEqual(profiler.timings[str][0], 3)
+        self.assertIn('busy_wait', profiler.report())
+
+    def test_sampling(self):
+        profiler = enable_profiling(BlockingActor, sampling=True, interval=0.001)
+        self.assertIsInstance(profiler, SamplingProfiler)
+        self.runtime.ask(self.actor, 'work')
+        disable_profiling(BlockingActor)
+        self.assertTrue(profiler._stopped.is_set())
+        self.assertIn('busy_wait', profiler.report())
+
+    def test_falls_back_to_sampling_when_cprofile_is_taken(self):
+        with mock.patch('cProfile.Profile', BusyProfile):
+            profiler = enable_profiling(BlockingActor)
+            self.assertIs(type(profiler), BehaviorProfiler)
+            for _ in range(5):
+                self.runtime.ask(self.actor, 'work')
+        disable_profiling(BlockingActor)
+        self.assertIsInstance(profiler._fallback, SamplingProfiler)
+        self.assertTrue(profiler._fallback._stopped.is_set())
+        self.assertEqual(profiler.timings[str][0], 5)
+        self.assertIn('busy_wait', profiler.report())